@@ -0,0 +1,250 @@
+"""Audit a finished game from an exported channel transcript
+
+Usage: python -m audit.audit_transcript TRANSCRIPT [--ruleset FILE]
+       [--workers N] [--output FILE]
+
+The transcript has one JSON object per line with the "id", "content" and
+"author" of each message, oldest first. Messages are parsed and their items
+resolved across a process pool, then the moves are checked in order with the
+same rules as the bot. The report lists invalid moves, deaths, the rebuilt
+killed list and the final board.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+import config
+from cogs.validation.game_state import Outcome
+from cogs.validation.killed_list import render_entries
+from cogs.validation.parser import ParsedMove
+from cogs.validation.ruleset import Ruleset, load_ruleset
+from cogs.validation.validation import (
+    check_move,
+    count_remaining,
+    get_listed_choices,
+    rejected,
+    validate_plus_and_minus,
+)
+from cogs.validation.validation_error import ValidationError
+
+# messages sent to a worker at a time
+chunk_size = 2000
+
+
+class Message(NamedTuple):
+    id: int
+    author: str
+    content: str
+
+
+class Resolved(NamedTuple):
+    """The parts of a move the checks need, small enough to send back quickly"""
+
+    index: int
+    signs: Tuple[Optional[str], ...]
+    line_count: int
+    # (item, number, sign) of each line, or None if an item wasn't recognized
+    listed: Optional[Tuple[Tuple[str, int, Optional[str]], ...]]
+    error: Optional[str]
+
+    def to_move(self) -> ParsedMove:
+        """Rebuild the move with its choices already resolved"""
+        move = ParsedMove(True, (), (), self.signs, self.line_count)
+        if self.listed is not None:
+            move.listed = {item: (num, sign) for item, num, sign in self.listed}
+        return move
+
+
+class Report(NamedTuple):
+    moves: int
+    messages: int
+    invalid: List[Tuple[Message, str]]
+    deaths: List[Tuple[Message, str, int]]
+    killed: Dict[int, str]
+    board: Dict[str, int]
+
+
+def read_transcript(path: str) -> Iterator[Message]:
+    """Read the messages of a JSON lines transcript"""
+    with open(path, "r", encoding="utf-8") as f:
+        for number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                data = json.loads(line)
+                author = data.get("author", "")
+                if isinstance(author, dict):
+                    author = author.get("name", "")
+                yield Message(int(data["id"]), str(author), data.get("content", ""))
+            except (ValueError, KeyError, TypeError) as error:
+                raise ValueError(f"Line {number} of {path} is invalid: {error!r}")
+
+
+__worker_ruleset: Optional[Ruleset] = None
+
+
+def load_worker(ruleset_path: str):
+    """Compile the ruleset once in each worker process"""
+    global __worker_ruleset
+    __worker_ruleset = load_ruleset(ruleset_path)
+
+
+def resolve_chunk(chunk: List[Tuple[int, str]]) -> List[Resolved]:
+    """Parse messages and resolve their items, keeping only the moves"""
+    resolved = []
+    for index, content in chunk:
+        move = __worker_ruleset.parse(content)
+        if not move.matched:
+            continue
+        try:
+            listed = tuple(
+                (item, num, sign)
+                for item, (num, sign) in get_listed_choices(move).items()
+            )
+            error = None
+        except ValidationError as validation_error:
+            listed, error = None, validation_error.message
+        resolved.append(Resolved(index, move.signs, move.line_count, listed, error))
+    return resolved
+
+
+def chunks(messages: List[Message]) -> Iterator[List[Tuple[int, str]]]:
+    """Split the messages that can be moves into chunks for the workers"""
+    chunk: List[Tuple[int, str]] = []
+    for index, message in enumerate(messages):
+        # skip messages that can't be a move before sending them to a worker
+        if "-" not in message.content:
+            continue
+        chunk.append((index, message.content))
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def resolve_all(
+    messages: List[Message], ruleset_path: str, workers: int
+) -> Iterator[Resolved]:
+    """Parse and resolve every message, in order"""
+    # a pool only pays off once there are several chunks to share
+    if workers <= 1 or len(messages) <= chunk_size:
+        load_worker(ruleset_path)
+        for chunk in chunks(messages):
+            yield from resolve_chunk(chunk)
+        return
+    with ProcessPoolExecutor(
+        workers, initializer=load_worker, initargs=(ruleset_path,)
+    ) as pool:
+        for resolved in pool.map(resolve_chunk, chunks(messages)):
+            yield from resolved
+
+
+def audit_move(
+    previous_board: Dict[str, int],
+    previous_error: Optional[str],
+    move: ParsedMove,
+    error: Optional[str],
+) -> Outcome:
+    """Check a move against the board before it, like the bot does"""
+    # the bot can't read the board of a move with unrecognized items, so the
+    # move after it is rejected with the same problem
+    if previous_error is not None:
+        if error is None:
+            return rejected(move, ValidationError(previous_error))
+        return Outcome(False, previous_error, None, count_remaining(move), None)
+    if error is None:
+        return check_move(previous_board, move)
+    # signs are checked before items are resolved
+    try:
+        validate_plus_and_minus(move)
+    except ValidationError as sign_error:
+        error = sign_error.message
+    return Outcome(False, error, None, count_remaining(move), None)
+
+
+def audit(messages: List[Message], resolved: Iterable[Resolved]) -> Report:
+    """Check the moves in order and collect invalid moves and deaths"""
+    invalid: List[Tuple[Message, str]] = []
+    deaths: List[Tuple[Message, str, int]] = []
+    killed: Dict[int, str] = {}
+    killed_items = set()
+    board: Dict[str, int] = {}
+    previous_error: Optional[str] = None
+    moves = 0
+    for item in resolved:
+        message = messages[item.index]
+        outcome = audit_move(board, previous_error, item.to_move(), item.error)
+        moves += 1
+        if not outcome.valid:
+            invalid.append((message, outcome.problem))
+        # item was killed (and it's not already on the list)
+        elif (
+            outcome.death
+            and outcome.death not in killed_items
+            and outcome.remaining not in killed
+        ):
+            killed[outcome.remaining] = outcome.death
+            killed_items.add(outcome.death)
+            deaths.append((message, outcome.death, outcome.remaining))
+        board = outcome.board or {}
+        previous_error = item.error
+    return Report(moves, len(messages), invalid, deaths, killed, board)
+
+
+def format_report(report: Report) -> str:
+    lines = [
+        f"{report.messages} messages, {report.moves} moves,"
+        f" {len(report.invalid)} invalid, {len(report.deaths)} deaths",
+        "",
+        "Invalid moves:",
+    ]
+    lines += [
+        f"  {message.id} ({message.author}): {problem}"
+        for message, problem in report.invalid
+    ] or ["  none"]
+    lines += ["", "Deaths:"]
+    lines += [
+        f"  #{placement} {item} ({message.id}, {message.author})"
+        for message, item, placement in report.deaths
+    ] or ["  none"]
+    lines += ["", "Killed list:", render_entries(report.killed) or "  empty"]
+    lines += ["", "Final board:"]
+    lines += [f"  {item} - {count}" for item, count in report.board.items()] or [
+        "  empty"
+    ]
+    return "\n".join(lines)
+
+
+def main(argv: List[str] = sys.argv[1:]):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("transcript", help="JSON lines file of the channel")
+    parser.add_argument(
+        "--ruleset",
+        default=os.path.join(config.RULESETS_DIR, "default.json"),
+        help="ruleset file of the game",
+    )
+    parser.add_argument(
+        "--workers", type=int, default=os.cpu_count() or 1, help="worker processes"
+    )
+    parser.add_argument("--output", help="file to write the report to")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    messages = list(read_transcript(args.transcript))
+    report = audit(messages, resolve_all(messages, args.ruleset, args.workers))
+    text = format_report(report)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    print(text)
+    print(f"\nAudited in {time.perf_counter() - start:.2f} s", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
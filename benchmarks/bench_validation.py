@@ -0,0 +1,171 @@
+"""Offline micro-benchmarks of message validation
+
+Usage: python -m benchmarks.bench_validation [--moves N] [--output FILE]
+
+Prints one JSON object per benchmark with ops/sec, p50 and p99 latency in
+microseconds, and the peak memory allocated while running it.
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Sequence
+
+from cogs.validation.game import Game
+from cogs.validation.killed_list import KilledList, killed_list_placeholder
+from cogs.validation.parser import ParsedMove
+from cogs.validation.validation import (
+    get_board,
+    get_listed_choices,
+    message_matches_pattern,
+    parse_cache,
+    validate_choices,
+    validate_message,
+    validate_plus_and_minus,
+)
+from cogs.validation.validation_error import ValidationError
+
+from .fakes import FakeChannel, FakeMessage, FakeOutbox, FakeStore, FakeUser
+from .transcripts import Event, generate, ruleset
+
+
+def summarize(name: str, timings: Sequence[int], peak: int) -> Dict:
+    """Build the result of a benchmark from nanosecond timings"""
+    ordered = sorted(timings)
+    total = sum(ordered) or 1
+    return {
+        "benchmark": name,
+        "ops": len(ordered),
+        "ops_per_sec": round(len(ordered) / (total / 1e9), 1),
+        "p50_us": round(ordered[len(ordered) // 2] / 1000, 2),
+        "p99_us": round(
+            ordered[min(len(ordered) - 1, len(ordered) * 99 // 100)] / 1000, 2
+        ),
+        "mean_us": round(statistics.fmean(ordered) / 1000, 2),
+        "peak_alloc_bytes": peak,
+    }
+
+
+def measure(name: str, args: Sequence, func: Callable) -> Dict:
+    """Time func on each argument, then run again to trace allocations"""
+    timings: List[int] = []
+    for arg in args:
+        start = time.perf_counter_ns()
+        func(arg)
+        timings.append(time.perf_counter_ns() - start)
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    tracemalloc.reset_peak()
+    for arg in args:
+        func(arg)
+    peak = tracemalloc.get_traced_memory()[1] - before
+    tracemalloc.stop()
+    return summarize(name, timings, peak)
+
+
+def ignore_errors(func: Callable) -> Callable:
+    """Invalid moves are part of the workload"""
+
+    def run(arg):
+        try:
+            func(arg)
+        except ValidationError:
+            pass
+
+    return run
+
+
+def unresolved(move: ParsedMove) -> ParsedMove:
+    """Forget resolved choices so that they are looked up again"""
+    move.listed = None
+    return move
+
+
+def bench_functions(events: List[Event]) -> List[Dict]:
+    contents = [event.content for event in events]
+    moves = [ruleset.parse(content) for content in contents]
+    listed = [m for m in moves if message_matches_pattern(m)]
+    pairs = []
+    for previous, move in zip(listed, listed[1:]):
+        try:
+            pairs.append((get_board(previous), get_listed_choices(move)))
+        except ValidationError:
+            continue
+    return [
+        measure("parse_move", contents, ruleset.parse),
+        measure("message_matches_pattern", moves, message_matches_pattern),
+        measure(
+            "validate_plus_and_minus", listed, ignore_errors(validate_plus_and_minus)
+        ),
+        measure(
+            "get_listed_choices",
+            listed,
+            ignore_errors(lambda m: get_listed_choices(unresolved(m))),
+        ),
+        measure(
+            "validate_choices",
+            pairs,
+            ignore_errors(lambda pair: validate_choices(*pair)),
+        ),
+    ]
+
+
+async def replay(events: List[Event]) -> List[int]:
+    """Post the transcript to a fake channel and validate every move"""
+    channel, chat = FakeChannel(), FakeChannel("give-and-take-chat")
+    players = [FakeUser(f"player{i}") for i in range(8)]
+    game = Game(channel.id, chat.id, ruleset)
+    game.channel, game.chat = channel, chat
+    game.killed_list = KilledList([await chat.send(killed_list_placeholder)])
+    outbox, store = FakeOutbox(), FakeStore()
+    posted: List[FakeMessage] = []
+    timings: List[int] = []
+    for i, event in enumerate(events):
+        if event.edit_of is None:
+            message = FakeMessage(channel, players[i % len(players)], event.content)
+        else:
+            message = posted[event.edit_of]
+            message.edit_content(event.content)
+        posted.append(message)
+        start = time.perf_counter_ns()
+        move = parse_cache.get(message, ruleset)
+        if message_matches_pattern(move):
+            await validate_message(message, move, game, outbox, store)
+        timings.append(time.perf_counter_ns() - start)
+    return timings
+
+
+def bench_validate_message(events: List[Event]) -> Dict:
+    timings = asyncio.run(replay(events))
+    parse_cache.clear()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    tracemalloc.reset_peak()
+    asyncio.run(replay(events))
+    peak = tracemalloc.get_traced_memory()[1] - before
+    tracemalloc.stop()
+    return summarize("validate_message", timings, peak)
+
+
+def main(argv: Sequence[str] = sys.argv[1:]):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--moves", type=int, default=500, help="moves per game")
+    parser.add_argument("--seed", type=int, default=0, help="transcript seed")
+    parser.add_argument("--output", help="file to write the results to")
+    args = parser.parse_args(argv)
+
+    events = generate(moves=args.moves, seed=args.seed)
+    results = bench_functions(events) + [bench_validate_message(events)]
+    lines = "\n".join(json.dumps(result) for result in results)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(lines + "\n")
+    print(lines)
+
+
+if __name__ == "__main__":
+    main()
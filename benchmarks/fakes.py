@@ -0,0 +1,112 @@
+"""Lightweight stand-ins for the discord.py objects used by validation"""
+
+import itertools
+from datetime import datetime
+from typing import AsyncIterator, List, Optional
+
+import discord
+
+_ids = itertools.count(1000)
+
+
+class FakeUser:
+    def __init__(self, name: str, bot: bool = False):
+        self.id = next(_ids)
+        self.name = name
+        self.bot = bot
+        self.mention = f"<@{self.id}>"
+        self.display_name = name
+
+
+class FakeChannel:
+    """Text channel that keeps its messages in a list"""
+
+    def __init__(self, name: str = "give-and-take"):
+        self.id = next(_ids)
+        self.name = name
+        self.messages: List["FakeMessage"] = []
+        self.sent = 0
+
+    def history(
+        self,
+        limit: Optional[int] = 100,
+        before: Optional[discord.abc.Snowflake] = None,
+        after: Optional[discord.abc.Snowflake] = None,
+        oldest_first: bool = False,
+    ) -> AsyncIterator["FakeMessage"]:
+        messages = [
+            m
+            for m in self.messages
+            if (before is None or m.id < before.id)
+            and (after is None or m.id > after.id)
+        ]
+        if not oldest_first:
+            messages.reverse()
+
+        async def iterate():
+            for message in messages[:limit]:
+                yield message
+
+        return iterate()
+
+    async def send(self, content: Optional[str] = None, **_) -> "FakeMessage":
+        self.sent += 1
+        return FakeMessage(self, FakeUser("bot", bot=True), content or "")
+
+
+class FakeMessage:
+    def __init__(self, channel: FakeChannel, author: FakeUser, content: str):
+        self.id = next(_ids)
+        self.channel = channel
+        self.author = author
+        self.content = content
+        self.created_at = datetime.now()
+        self.edited_at: Optional[datetime] = None
+        self.reactions: list = []
+        self.pinned = False
+        channel.messages.append(self)
+
+    def edit_content(self, content: str):
+        """Edit the message the way discord.py updates a cached message"""
+        self.content = content
+        self.edited_at = datetime.now()
+
+    async def add_reaction(self, emoji: str):
+        pass
+
+    async def remove_reaction(self, emoji: str, member: FakeUser):
+        pass
+
+    async def edit(self, content: str):
+        self.edit_content(content)
+
+
+class FakeOutbox:
+    """Outbox that only counts the calls validation asks for"""
+
+    def __init__(self):
+        self.calls = 0
+        self.__edits = {}
+
+    def set_validation(self, message: FakeMessage, valid: bool):
+        self.calls += 1
+
+    def react(self, message: FakeMessage, emoji: str):
+        self.calls += 1
+
+    def unreact(self, message: FakeMessage, emoji: str):
+        self.calls += 1
+
+    def edit(self, message: FakeMessage, content: str):
+        self.calls += 1
+        message.edit_content(content)
+
+    def notify(self, channel: FakeChannel, content=None, embed=None):
+        self.calls += 1
+
+
+class FakeStore:
+    """Store that doesn't save anything"""
+
+    def save(self, game):
+        pass
@@ -0,0 +1,97 @@
+"""Synthetic give and take transcripts for benchmarking validation"""
+
+import os
+import random
+from typing import Dict, List, NamedTuple, Optional
+
+import config
+from cogs.validation.ruleset import load_ruleset
+
+ruleset = load_ruleset(os.path.join(config.RULESETS_DIR, "default.json"))
+
+chat_lines = [
+    "nooo not the pineapple",
+    "who keeps killing the olives?",
+    "lol",
+    "I think we should save the tofu",
+    "brb",
+    "that was a mistake - sorry",
+]
+
+
+class Event(NamedTuple):
+    """A message posted in the channel, or an edit of an earlier post"""
+
+    content: str
+    edit_of: Optional[int] = None  # index of the event that is edited
+    is_move: bool = False
+    # the items given and taken by a move
+    plus: Optional[str] = None
+    minus: Optional[str] = None
+
+
+def render(
+    board: Dict[str, int],
+    plus: Optional[str] = None,
+    minus: Optional[str] = None,
+    names: Optional[Dict[str, str]] = None,
+) -> str:
+    """Write the board the way players post it"""
+    names = names or {}
+    lines = []
+    for item, count in board.items():
+        if count <= 0 and item != minus:
+            continue
+        sign = " +" if item == plus else " -" if item == minus else ""
+        lines.append(f"{names.get(item, item)} - {count}{sign}")
+    return "\n".join(lines)
+
+
+def misspell(rng: random.Random, item: str) -> str:
+    """Use an alias or swap two letters of the name"""
+    if item in ruleset.aliases and rng.random() < 0.5:
+        return rng.choice(ruleset.aliases[item])
+    if len(item) < 5:
+        return item.lower()
+    i = rng.randrange(1, len(item) - 2)
+    return item[:i] + item[i + 1] + item[i] + item[i + 2 :]
+
+
+def generate(
+    moves: int = 500,
+    start: int = 10,
+    chat_rate: float = 0.3,
+    misspell_rate: float = 0.05,
+    edit_rate: float = 0.05,
+    seed: int = 0,
+) -> List[Event]:
+    """Generate a transcript of a game with chat, misspellings and edits"""
+    rng = random.Random(seed)
+    board = {item: start for item in ruleset.choices}
+    events = [Event(render(board), is_move=True)]
+    for _ in range(moves):
+        alive = [item for item, count in board.items() if count > 0]
+        if len(alive) < 2:
+            break
+        plus, minus = rng.sample(alive, 2)
+        board[plus] += 1
+        board[minus] -= 1
+        names = {
+            item: misspell(rng, item) for item in board if rng.random() < misspell_rate
+        }
+        events.append(
+            Event(
+                render(board, plus, minus, names), is_move=True, plus=plus, minus=minus
+            )
+        )
+        # edit the move that was just posted
+        if rng.random() < edit_rate:
+            events.append(
+                Event(render(board, plus, minus), edit_of=len(events) - 1, is_move=True)
+            )
+        # noise between moves
+        while rng.random() < chat_rate:
+            events.append(Event(rng.choice(chat_lines)))
+        # drop items that died from the next post
+        board = {item: count for item, count in board.items() if count > 0}
+    return events
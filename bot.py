@@ -1,35 +1,95 @@
+from utils.startup import startup
+
 import discord
 import os
 from discord_slash import SlashCommand
 from discord.ext import commands
 import config
+from utils.metrics import instrument_http
+from utils.slash_sync import sync_if_changed
 
+# directory of the cogs, wherever the bot is started from
+cogs_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cogs")
 
-def main():
-    # allows privledged intents for monitoring members joining, roles editing, and role assignments
-    # these need to be enabled in the developer portal as well
-    intents = discord.Intents.default()
-    intents.guilds = True
-    intents.members = True
 
-    bot = commands.Bot(config.BOT_PREFIX, intents=intents)  # bot command prefix
+def create_bot() -> commands.Bot:
+    """Build the bot with its slash commands and cogs, without connecting it"""
+    if config.LEAN_MODE:
+        # only the events the bot reacts to, and no member cache
+        intents = discord.Intents.none()
+        intents.guilds = True
+        intents.guild_messages = True
+        options = dict(
+            member_cache_flags=discord.MemberCacheFlags.none(),
+            chunk_guilds_at_startup=False,
+        )
+    else:
+        # allows privledged intents for monitoring members joining, roles editing, and role assignments
+        # these need to be enabled in the developer portal as well
+        intents = discord.Intents.default()
+        intents.guilds = True
+        intents.members = True
+        options = {}
+
+    bot_class = commands.Bot
+    if config.SHARD_COUNT:
+        # each process runs a range of shards, and the games of their guilds
+        bot_class = commands.AutoShardedBot
+        options.update(
+            shard_count=(
+                None if config.SHARD_COUNT == "auto" else int(config.SHARD_COUNT)
+            ),
+            shard_ids=config.SHARD_IDS or None,
+        )
+
+    bot = bot_class(
+        config.BOT_PREFIX,  # bot command prefix
+        intents=intents,
+        max_messages=config.MAX_MESSAGES,
+        **options,
+    )
 
-    # slash commands
-    setattr(bot, "slash", SlashCommand(bot, override_type=True, sync_commands=True))
+    # count every REST call, including the ones made outside the outbox
+    instrument_http(bot.http)
+
+    # slash commands (synced in on_ready only if they changed)
+    setattr(bot, "slash", SlashCommand(bot, override_type=True))
 
     # Get the modules of all cogs whose directory structure is modules/<module_name>/cog.py
-    for folder in os.listdir("cogs"):
-        if os.path.exists(os.path.join("cogs", folder, "cog.py")):
-            bot.load_extension(f"cogs.{folder}.cog")
+    with startup.phase("loading cogs"):
+        for folder in sorted(os.listdir(cogs_dir)):
+            if os.path.exists(os.path.join(cogs_dir, folder, "cog.py")):
+                with startup.phase(f"loading cogs.{folder}"):
+                    bot.load_extension(f"cogs.{folder}.cog")
 
     @bot.event
     async def on_ready():
         """When discord is connected"""
         print(f"{bot.user.name} has connected to Discord!")
+        startup.mark("connected")
         activity = discord.Activity(
             type=discord.ActivityType.listening, name="#give-and-take"
         )
         await bot.change_presence(activity=activity)
+        # on_ready is called again after reconnecting, and global commands
+        # are only synced by the process running the first shard
+        first_shard = 0 in (getattr(bot, "shard_ids", None) or [0])
+        if first_shard and not getattr(bot, "slash_synced", False):
+            with startup.phase("syncing slash commands"):
+                synced = await sync_if_changed(
+                    bot.slash, bot.user.id, config.SLASH_MANIFEST
+                )
+            print("Slash commands synced." if synced else "Slash commands unchanged.")
+            setattr(bot, "slash_synced", True)
+
+    return bot
+
+
+def main():
+    startup.enabled = True
+    startup.mark("imports done")
+
+    bot = create_bot()
 
     # Run Discord bot
     bot.run(config.DISCORD_TOKEN)
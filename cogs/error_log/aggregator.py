@@ -0,0 +1,144 @@
+import hashlib
+import os
+import time
+import traceback
+from typing import Dict, List, Optional, Tuple
+
+import discord
+from discord.ext.commands import errors
+
+# errors raised in these files are located by their caller in the bot
+project_dir = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+
+
+class ErrorEntry:
+    """Occurrences of errors with the same fingerprint"""
+
+    __slots__ = (
+        "fingerprint",
+        "kind",
+        "location",
+        "message",
+        "count",
+        "first_seen",
+        "last_seen",
+        "logged_at",
+        "folded",
+    )
+
+    def __init__(self, fingerprint: str, kind: str, location: str, message: str):
+        self.fingerprint = fingerprint
+        self.kind = kind
+        self.location = location
+        self.message = message
+        self.count = 0
+        self.first_seen = time.time()
+        self.last_seen = self.first_seen
+        # when the error was last written to the log
+        self.logged_at = 0.0
+        # occurrences since then that weren't written
+        self.folded = 0
+
+
+def unwrap(error: BaseException) -> BaseException:
+    """Returns the exception raised by a command instead of its wrapper"""
+    if isinstance(error, errors.CommandInvokeError) and error.original is not None:
+        return error.original
+    return error
+
+
+def describe(error: Optional[BaseException]) -> Tuple[str, str]:
+    """Returns the type and the place in the bot's code where an error was raised"""
+    if error is None:
+        return "Unknown", "unknown"
+    error = unwrap(error)
+    kind = type(error).__name__
+    if isinstance(error, discord.HTTPException):
+        kind = f"{kind} {error.status}"
+    location = "unknown"
+    for frame, line in traceback.walk_tb(error.__traceback__):
+        filename = frame.f_code.co_filename
+        in_bot = filename.startswith(project_dir) and "site-packages" not in filename
+        # keep the innermost frame, preferring the bot's own code
+        if in_bot or location == "unknown":
+            path = os.path.relpath(filename, project_dir)
+            location = f"{path}:{line} in {frame.f_code.co_name}"
+    return kind, location
+
+
+class ErrorAggregator:
+    """Fingerprints errors by type and location, and folds repeats
+
+    The first occurrence of a fingerprint is logged in full. Repeats within
+    `window` seconds are only counted, and logged as one entry with the count
+    once the window has passed.
+    """
+
+    def __init__(self, window: float = 60.0, max_entries: int = 500):
+        self.window = window
+        self.max_entries = max_entries
+        self.__entries: Dict[str, ErrorEntry] = {}
+
+    def observe(self, error: Optional[BaseException]) -> Tuple[ErrorEntry, bool]:
+        """Count an error and return its entry and whether to log it now"""
+        kind, location = describe(error)
+        fingerprint = hashlib.sha1(f"{kind}|{location}".encode()).hexdigest()[:10]
+        entry = self.__entries.get(fingerprint)
+        if entry is None:
+            self.__forget_oldest()
+            message = str(unwrap(error)) if error is not None else ""
+            entry = self.__entries[fingerprint] = ErrorEntry(
+                fingerprint, kind, location, message[:200]
+            )
+        now = time.time()
+        entry.count += 1
+        entry.last_seen = now
+        if now - entry.logged_at < self.window:
+            entry.folded += 1
+            return entry, False
+        entry.logged_at = now
+        return entry, True
+
+    def due(self) -> List[Tuple[ErrorEntry, int]]:
+        """Returns the entries with repeats that weren't logged once their
+        window has passed, with the number of repeats, and marks them as logged"""
+        now = time.time()
+        due = []
+        for entry in self.__entries.values():
+            if entry.folded and now - entry.logged_at >= self.window:
+                due.append((entry, entry.folded))
+                entry.logged_at = now
+                entry.folded = 0
+        return due
+
+    def top(self, limit: int = 10) -> List[ErrorEntry]:
+        """Returns the most frequent errors"""
+        entries = sorted(self.__entries.values(), key=lambda e: e.count, reverse=True)
+        return entries[:limit]
+
+    def __forget_oldest(self):
+        """Keep the number of fingerprints bounded"""
+        if len(self.__entries) >= self.max_entries:
+            oldest = min(self.__entries.values(), key=lambda e: e.last_seen)
+            del self.__entries[oldest.fingerprint]
+
+
+class NoticeLimiter:
+    """Allows at most `rate` error messages every `per` seconds in a channel"""
+
+    def __init__(self, rate: int, per: float):
+        self.rate = rate
+        self.per = per
+        self.__sent: Dict[int, List[float]] = {}
+        self.suppressed = 0
+
+    def allow(self, channel_id: int) -> bool:
+        now = time.monotonic()
+        sent = [t for t in self.__sent.get(channel_id, []) if now - t < self.per]
+        if len(sent) >= self.rate:
+            self.__sent[channel_id] = sent
+            self.suppressed += 1
+            return False
+        sent.append(now)
+        self.__sent[channel_id] = sent
+        return True
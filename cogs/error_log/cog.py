@@ -1,12 +1,55 @@
+import asyncio
 import sys
 
-from cogs.error_log.error_handler import ErrorHandler
-from discord.ext import commands
+import time
+
+import config
+from cogs.error_log.error_handler import ErrorHandler, error_aggregator, notice_limiter
+from cogs.error_log.log_file import log_to_file, start_log_file, stop_log_file, tail
+from discord import logging
+from discord.ext import commands, tasks
+from utils.embedder import stats_embed
 
 
 class ErrorLog(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
+        self.flush_repeats.change_interval(seconds=config.ERROR_WINDOW)
+        self.flush_repeats.start()
+
+    def cog_unload(self):
+        self.flush_repeats.cancel()
+
+    @tasks.loop(seconds=60)
+    async def flush_repeats(self):
+        """Log the repeats of errors that were folded during their window"""
+        for entry, repeats in error_aggregator.due():
+            text = (
+                f"[{entry.fingerprint}] {entry.kind} at {entry.location}"
+                f" repeated {repeats} more times"
+            )
+            logging.warning(text)
+            log_to_file(text)
+
+    @commands.command(name="errors")
+    @commands.has_permissions(administrator=True)
+    async def errors(self, ctx, limit: int = 10):
+        """Show the most frequent errors since the bot started"""
+        entries = error_aggregator.top(limit)
+        if not entries:
+            return await ctx.send("No errors since the bot started.")
+        now = time.time()
+        sections = {
+            f"{entry.kind} at {entry.location}": {
+                "fingerprint": entry.fingerprint,
+                "count": entry.count,
+                "last seen": f"{(now - entry.last_seen) / 60:.0f} min ago",
+                "message": entry.message or "none",
+            }
+            for entry in entries
+        }
+        sections["Error messages"] = {"suppressed": notice_limiter.suppressed}
+        await ctx.send(embed=stats_embed("Top errors", sections))
 
     @commands.command(name="logs")
     @commands.has_permissions(administrator=True)
@@ -14,16 +57,21 @@ class ErrorLog(commands.Cog):
         """Show recent logs from err.log"""
         # log in console that a ping was received
         print('Executing command "logs".')
-        # reply with end of log file
-        with open("err.log", "r", encoding="utf-8") as f:
-            # read logs file
-            lines = f.readlines()
-            last_n_lines = "".join(lines[-num_lines:])
-            # trim the logs if too long
-            if len(last_n_lines) > 1990:
-                last_n_lines = f"․․․\n{last_n_lines[-1990:]}"
-            # send the logs
-            await ctx.send(f"```{last_n_lines}```")
+        # read the end of the log file without blocking the event loop
+        loop = asyncio.get_running_loop()
+        try:
+            last_n_lines = await loop.run_in_executor(
+                None, tail, config.ERROR_LOG, num_lines
+            )
+        except FileNotFoundError:
+            last_n_lines = ""
+        if not last_n_lines.strip():
+            return await ctx.send("No errors have been logged.")
+        # trim the logs if too long
+        if len(last_n_lines) > 1990:
+            last_n_lines = f"․․․\n{last_n_lines[-1990:]}"
+        # send the logs
+        await ctx.send(f"```{last_n_lines}```")
 
 
 async def on_error(event, *args, **kwargs):
@@ -53,6 +101,13 @@ async def on_command_error(ctx, error):
 
 # setup functions for bot
 def setup(bot):
+    start_log_file(
+        config.ERROR_LOG, config.ERROR_LOG_MAX_BYTES, config.ERROR_LOG_BACKUPS
+    )
     bot.add_cog(ErrorLog(bot))
     bot.on_error = on_error
     bot.on_command_error = on_command_error
+
+
+def teardown(bot):
+    stop_log_file()
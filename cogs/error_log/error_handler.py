@@ -1,9 +1,20 @@
 import traceback
-from datetime import datetime
 
+import config
 from discord import logging
 from discord.ext.commands import errors
 
+from .aggregator import ErrorAggregator, NoticeLimiter
+from .log_file import log_to_file
+
+# repeats of an error are folded into one log entry per window
+error_aggregator = ErrorAggregator(config.ERROR_WINDOW)
+
+# error messages sent to users, per channel
+notice_limiter = NoticeLimiter(
+    config.ERROR_NOTICES_PER_CHANNEL, config.ERROR_NOTICE_PERIOD
+)
+
 
 class ErrorHandler:
     """
@@ -14,19 +25,25 @@ class ErrorHandler:
         self.message = message
         self.error = error
         self.human_details = human_details
-        # formats the error as traceback
-        self.trace = traceback.format_exc()
 
     async def handle_error(self):
         """When an exception is raised, log it in err.log and bot log channel"""
-        error_details = self.trace if self.trace != "NoneType: None\n" else self.error
-        # logs error as warning in console
-        logging.warning(error_details)
-        # log to err.log
-        self.__log_to_file("err.log", error_details)
-        # notify user of error
+        entry, log_now = error_aggregator.observe(self.error)
+        if log_now:
+            # formats the error as traceback (only when it is logged)
+            trace = traceback.format_exc()
+            error_details = trace if trace != "NoneType: None\n" else self.error
+            error_details = f"[{entry.fingerprint}] {error_details}"
+            if entry.folded:
+                error_details += f"\n(repeated {entry.folded} more times before this)"
+                entry.folded = 0
+            # logs error as warning in console
+            logging.warning(error_details)
+            # log to err.log (written in the background)
+            log_to_file(error_details)
+        # notify user of error, unless the channel got too many error messages
         user_error = self.__user_error_message()
-        if user_error:
+        if user_error and notice_limiter.allow(self.message.channel.id):
             await self.message.channel.send(user_error)
 
     def __user_error_message(self):
@@ -55,9 +72,3 @@ class ErrorHandler:
                 role_name = self.message.guild.get_role(role_id)
                 return f"{role_name} role is required to use this command."
             return self.error
-
-    def __log_to_file(self, filename: str, text: str):
-        """appends the date and logs text to a file"""
-        with open(filename, "a", encoding="utf-8") as f:
-            # write the current time and log text at end of file
-            f.write(f"{datetime.now()}\n{text}\n------------------------------------\n")
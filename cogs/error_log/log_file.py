@@ -0,0 +1,63 @@
+import logging
+import os
+import queue
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Optional
+
+separator = "------------------------------------"
+
+# errors are handed to a background thread so the event loop never waits on disk
+file_logger = logging.getLogger("give_and_take.errors")
+file_logger.propagate = False
+
+__listener: Optional[QueueListener] = None
+
+
+def start_log_file(filename: str, max_bytes: int, backup_count: int):
+    """Start writing logged errors to a rotating file in the background"""
+    global __listener
+    if __listener is not None:
+        return
+    handler = RotatingFileHandler(
+        filename, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8"
+    )
+    handler.setFormatter(logging.Formatter(f"%(asctime)s\n%(message)s\n{separator}"))
+    records: queue.SimpleQueue = queue.SimpleQueue()
+    file_logger.addHandler(QueueHandler(records))
+    __listener = QueueListener(records, handler)
+    __listener.start()
+
+
+def stop_log_file():
+    """Write the errors that are still buffered and close the file"""
+    global __listener
+    if __listener is None:
+        return
+    __listener.stop()
+    for handler in __listener.handlers:
+        handler.close()
+    for handler in list(file_logger.handlers):
+        file_logger.removeHandler(handler)
+    __listener = None
+
+
+def log_to_file(text: str):
+    """Queue text to be written to the log file with the current time"""
+    file_logger.error(text)
+
+
+def tail(filename: str, num_lines: int, block_size: int = 4096) -> str:
+    """Returns the last lines of a file
+    Reads blocks backwards from the end, so only the tail of the file is read
+    """
+    with open(filename, "rb") as f:
+        position = f.seek(0, os.SEEK_END)
+        data = b""
+        # one more newline than lines wanted, since the file ends with one
+        while position > 0 and data.count(b"\n") <= num_lines:
+            size = min(block_size, position)
+            position -= size
+            f.seek(position)
+            data = f.read(size) + data
+    lines = data.splitlines(keepends=True)[-num_lines:] if num_lines > 0 else []
+    return b"".join(lines).decode("utf-8", errors="replace")
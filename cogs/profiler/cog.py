@@ -0,0 +1,86 @@
+import io
+import time
+from typing import Dict, List
+
+import discord
+from discord.ext import commands
+from utils.embedder import stats_embed
+
+from .sampler import Profile, percentile, run_profile, slow_callback
+
+# longest profile that can be asked for, in seconds
+max_seconds = 300
+
+
+def profile_sections(profile: Profile) -> Dict[str, Dict[str, str]]:
+    """Sections of a profile summary to show in an embed"""
+    busy = sum(profile.stacks.values())
+
+    def share(count: int) -> str:
+        return f"{count / max(busy, 1):.1%} ({count})"
+
+    sections = {
+        "Samples": {
+            "window": f"{profile.seconds:.1f} s",
+            "samples": f"{profile.samples} every {profile.interval * 1000:g} ms",
+            "event loop busy": f"{busy / max(profile.samples, 1):.1%}",
+        },
+        "Hot functions (self)": {
+            name: share(count) for name, count in profile.hot_functions(8)
+        },
+        "Bot functions (total)": {
+            name: share(count) for name, count in profile.hot_bot_functions(8)
+        },
+    }
+    if profile.lags:
+        sections["Event loop lag"] = {
+            "mean": f"{sum(profile.lags) / len(profile.lags) * 1000:.1f} ms",
+            "p95": f"{percentile(profile.lags, 0.95) * 1000:.1f} ms",
+            "max": f"{max(profile.lags) * 1000:.1f} ms",
+        }
+    # the longest time each slow callback held the loop, and how often
+    slowest: Dict[str, List[float]] = {}
+    for callback in profile.slow_callbacks:
+        slowest.setdefault(callback.name, []).append(callback.seconds)
+    ranked = sorted(slowest.items(), key=lambda item: max(item[1]), reverse=True)
+    sections[f"Slow callbacks (≥ {slow_callback * 1000:g} ms)"] = {
+        name: f"{len(times)}× · max {max(times) * 1000:.0f} ms"
+        for name, times in ranked[:5]
+    }
+    return {heading: stats for heading, stats in sections.items() if stats}
+
+
+class Profiler(commands.Cog):
+    def __init__(self, bot: commands.Bot):
+        self.__bot = bot
+        self.__running = False
+
+    @commands.command()
+    @commands.has_permissions(administrator=True)
+    async def profile(self, ctx: commands.Context, seconds: float = 30):
+        """Sample where the event loop spends its time for a number of seconds
+        Sends a summary and the stacks in the collapsed format of flamegraph.pl
+        ```
+        >profile 30
+        ```
+        """
+        if self.__running:
+            return await ctx.send("A profile is already running.")
+        seconds = min(max(seconds, 1), max_seconds)
+        await ctx.send(f"Profiling for {seconds:g} seconds...")
+        self.__running = True
+        try:
+            profile = await run_profile(seconds)
+        finally:
+            self.__running = False
+        folded = io.BytesIO(profile.folded().encode("utf-8"))
+        filename = f"profile-{time.strftime('%Y%m%d-%H%M%S')}.folded"
+        await ctx.send(
+            embed=stats_embed("Profile", profile_sections(profile)),
+            file=discord.File(folded, filename),
+        )
+
+
+# setup functions for bot
+def setup(bot: commands.Bot):
+    bot.add_cog(Profiler(bot))
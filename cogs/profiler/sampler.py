@@ -0,0 +1,200 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+# code object of the method that runs each callback of the event loop
+callback_code = asyncio.events.Handle._run.__code__
+asyncio_dir = os.path.dirname(asyncio.__file__)
+project_dir = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+
+# callbacks holding the event loop for longer than this are reported
+# (the same threshold asyncio's debug mode uses)
+slow_callback = 0.1
+
+# a stack ending in one of these functions is the event loop waiting for events
+idle_functions = {("selectors.py", "select")}
+
+
+def is_bot_function(name: str) -> bool:
+    """Whether a function named by the sampler is part of the bot"""
+    path = name.rsplit(" (", 1)[-1]
+    return path.startswith(("bot.py", f"cogs{os.sep}", f"utils{os.sep}"))
+
+
+class SlowCallback(NamedTuple):
+    """A callback that kept the event loop from running anything else"""
+
+    name: str
+    seconds: float
+
+
+class Profile:
+    """Samples of the event loop thread, folded by stack"""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.started = time.perf_counter()
+        self.seconds = 0.0
+        # sample counts by stack, outermost frame first
+        self.stacks: Counter = Counter()
+        self.idle = 0
+        # seconds the loop woke up late from a sleep
+        self.lags: List[float] = []
+        self.slow_callbacks: List[SlowCallback] = []
+
+    @property
+    def samples(self) -> int:
+        return sum(self.stacks.values()) + self.idle
+
+    def folded(self) -> str:
+        """Stacks in the collapsed format read by flamegraph.pl and speedscope"""
+        lines = [f"{';'.join(stack)} {count}" for stack, count in self.stacks.items()]
+        if self.idle:
+            lines.append(f"(idle) {self.idle}")
+        return "\n".join(lines) + "\n"
+
+    def hot_functions(self, limit: int = 10) -> List[Tuple[str, int]]:
+        """Functions that were running when sampled, by number of samples"""
+        leaves: Counter = Counter()
+        for stack, count in self.stacks.items():
+            leaves[stack[-1]] += count
+        return leaves.most_common(limit)
+
+    def hot_bot_functions(self, limit: int = 10) -> List[Tuple[str, int]]:
+        """Functions of the bot on the stack when sampled, by number of samples"""
+        totals: Counter = Counter()
+        for stack, count in self.stacks.items():
+            for name in set(stack):
+                if is_bot_function(name):
+                    totals[name] += count
+        return totals.most_common(limit)
+
+
+class Sampler:
+    """Samples the stack of a thread from a background thread
+
+    The thread only exists while a profile is running, so the bot pays
+    nothing for the profiler the rest of the time.
+    """
+
+    def __init__(self, thread_id: int, profile: Profile):
+        self.__thread_id = thread_id
+        self.__profile = profile
+        self.__stop = threading.Event()
+        self.__thread = threading.Thread(
+            target=self.__run, name="profiler", daemon=True
+        )
+        self.__names: Dict[object, str] = {}
+        # the callback running at the previous sample, and since when
+        self.__callback = None
+        self.__callback_since = 0.0
+        self.__callback_name = ""
+
+    def start(self):
+        self.__thread.start()
+
+    def stop(self):
+        self.__stop.set()
+        self.__thread.join()
+        self.__callback_ended(time.perf_counter())
+        self.__callback = None
+
+    def __run(self):
+        while not self.__stop.wait(self.__profile.interval):
+            frame = sys._current_frames().get(self.__thread_id)
+            if frame is not None:
+                self.__sample(frame)
+            del frame
+
+    def __sample(self, frame):
+        now = time.perf_counter()
+        stack = []
+        callback = None
+        while frame is not None:
+            code = frame.f_code
+            if code is callback_code and callback is None:
+                callback = frame
+            stack.append(code)
+            frame = frame.f_back
+        stack.reverse()
+        top = stack[-1]
+        if (os.path.basename(top.co_filename), top.co_name) in idle_functions:
+            self.__profile.idle += 1
+        else:
+            self.__profile.stacks[tuple(self.__name(code) for code in stack)] += 1
+        # the same callback is still running
+        if callback is self.__callback:
+            return
+        self.__callback_ended(now)
+        self.__callback = callback
+        self.__callback_since = now
+        if callback is not None:
+            self.__callback_name = self.__task_name(stack)
+
+    def __callback_ended(self, now: float):
+        seconds = now - self.__callback_since
+        if self.__callback is not None and seconds >= slow_callback:
+            self.__profile.slow_callbacks.append(
+                SlowCallback(self.__callback_name, seconds)
+            )
+
+    def __task_name(self, stack: List) -> str:
+        """Name a callback after the outermost function it runs outside asyncio"""
+        inside = stack[stack.index(callback_code) + 1 :]
+        for code in inside:
+            if not code.co_filename.startswith(asyncio_dir):
+                return self.__name(code)
+        return self.__name(inside[0]) if inside else "unknown"
+
+    def __name(self, code) -> str:
+        """Function name and file, relative to the bot or to site-packages"""
+        name = self.__names.get(code)
+        if name is None:
+            path = code.co_filename
+            if path.startswith(project_dir) and "site-packages" not in path:
+                path = os.path.relpath(path, project_dir)
+            elif "site-packages" in path:
+                path = path.split("site-packages", 1)[1].lstrip(os.sep)
+            else:
+                path = os.path.basename(path)
+            function = getattr(code, "co_qualname", code.co_name)
+            name = self.__names[code] = f"{function} ({path})"
+        return name
+
+
+async def measure_lag(profile: Profile, stop: asyncio.Event, interval: float = 0.05):
+    """Record how late the event loop wakes up from short sleeps"""
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        start = loop.time()
+        await asyncio.sleep(interval)
+        profile.lags.append(max(0.0, loop.time() - start - interval))
+
+
+async def run_profile(seconds: float, interval: float = 0.01) -> Profile:
+    """Sample the event loop thread for a number of seconds"""
+    profile = Profile(interval)
+    sampler = Sampler(threading.get_ident(), profile)
+    stop = asyncio.Event()
+    lag = asyncio.create_task(measure_lag(profile, stop))
+    sampler.start()
+    try:
+        await asyncio.sleep(seconds)
+    finally:
+        stop.set()
+        # joining the thread takes at most one interval
+        sampler.stop()
+        await lag
+        profile.seconds = time.perf_counter() - profile.started
+    return profile
+
+
+def percentile(values: List[float], fraction: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
@@ -0,0 +1,281 @@
+import asyncio
+from typing import Dict, Optional
+
+import config
+import discord
+from cogs.validation.game import Game
+from cogs.validation.game_stats import GameStats, Trajectory
+from discord.ext import commands, tasks
+from utils.embedder import stats_embed
+from utils.memory import estimate, format_bytes, rss_bytes
+from utils.metrics import Histogram, label_text, metrics
+
+from .exporter import MetricsServer, write_metrics
+
+
+def describe_timing(histogram: Histogram) -> str:
+    """Count, mean and 95th percentile of a histogram"""
+    mean = histogram.sum / histogram.count if histogram.count else 0.0
+    return (
+        f"{histogram.count} · mean {mean * 1000:.2f} ms"
+        f" · p95 ≤ {histogram.quantile(0.95) * 1000:g} ms"
+    )
+
+
+def pipeline_sections() -> Dict[str, Dict[str, str]]:
+    """Sections of pipeline metrics to show in an embed"""
+    seen = metrics.counter("events_seen_total")
+    matched = metrics.counter("events_matched_total")
+    sections = {
+        "Events (seen / matched)": {
+            label_text(labels): f"{value:g} / {matched.get(labels, 0):g}"
+            for labels, value in seen.items()
+        },
+        "Outcomes": {
+            label_text(labels): f"{value:g}"
+            for labels, value in metrics.counter("validations_total").items()
+        },
+        "Stages": {
+            label_text(labels): describe_timing(histogram)
+            for labels, histogram in metrics.histogram("stage_seconds").items()
+        },
+        "Queue wait": {
+            label_text(labels): describe_timing(histogram)
+            for labels, histogram in metrics.histogram("queue_wait_seconds").items()
+        },
+        "API calls": {
+            label_text(labels): describe_timing(histogram)
+            for labels, histogram in metrics.histogram("api_call_seconds").items()
+        },
+        "API rate limit waits": {
+            label_text(labels): describe_timing(histogram)
+            for labels, histogram in metrics.histogram("api_wait_seconds").items()
+        },
+    }
+    return {heading: stats for heading, stats in sections.items() if stats}
+
+
+def format_duration(seconds: float) -> str:
+    """Write a duration in days, hours and minutes"""
+    minutes = int(seconds // 60)
+    days, minutes = divmod(minutes, 24 * 60)
+    hours, minutes = divmod(minutes, 60)
+    parts = [f"{days}d"] if days else []
+    parts += [f"{hours}h"] if hours or days else []
+    return " ".join(parts + [f"{minutes}m"])
+
+
+def sparkline(trajectory: Trajectory, width: int = 24) -> str:
+    """Draw the counts of an item with block characters"""
+    counts = trajectory.counts
+    if not counts:
+        return "no moves yet"
+    step = max(1, len(counts) // width)
+    sampled = list(counts[::step])[-width:]
+    if sampled[-1] != counts[-1]:
+        sampled.append(counts[-1])
+    top = max(max(sampled), 1)
+    return "".join("▁▂▃▄▅▆▇█"[min(7, count * 8 // (top + 1))] for count in sampled)
+
+
+def overview(game: Game) -> Dict[str, Dict[str, str]]:
+    """Sections summarizing the game"""
+    stats = game.stats
+    alive = len(game.ruleset.choices) - len(game.killed_list.by_item)
+    sections = {
+        "Game": {
+            "accepted moves": str(stats.moves),
+            "players": str(len(stats.players)),
+            "items left": str(alive),
+        }
+    }
+    deaths = sorted(stats.deaths.items(), key=lambda death: death[1].placement)
+    if deaths:
+        sections["Latest deaths"] = {
+            f"#{death.placement} {item}": (
+                f"by {stats.players.get(death.player_id, death.player_id)}"
+                f" after {death.moves} moves"
+            )
+            for item, death in deaths[:5]
+        }
+    return sections
+
+
+def player_sections(stats: GameStats, player_id: int) -> Dict[str, Dict[str, str]]:
+    """Sections of the statistics of a player"""
+    kills = [
+        f"#{death.placement} {item}"
+        for item, death in stats.deaths.items()
+        if death.player_id == player_id
+    ]
+    return {
+        "Moves": {
+            "accepted": str(stats.moves_by_player[player_id]),
+            "rejected": str(stats.invalid_by_player[player_id]),
+        },
+        "Kills": {"items": ", ".join(kills) or "none"},
+    }
+
+
+def item_sections(stats: GameStats, item: str) -> Dict[str, Dict[str, str]]:
+    """Sections of the statistics of an item"""
+    trajectory = stats.trajectories.get(item, Trajectory())
+    counts = trajectory.counts
+    section = {
+        "now": str(trajectory.last) if counts else "unknown",
+        "peak": str(max(counts)) if counts else "unknown",
+        "history": sparkline(trajectory),
+    }
+    death = stats.deaths.get(item)
+    if death is not None:
+        killer = stats.players.get(death.player_id, str(death.player_id))
+        section["killed"] = f"#{death.placement} by {killer}"
+        section["survived"] = f"{death.moves} moves ({format_duration(death.seconds)})"
+    return {"Item": section}
+
+
+def memory_sections(bot: commands.Bot) -> Dict[str, Dict[str, str]]:
+    """Sections of the estimated memory of each cache"""
+    caches = {
+        "messages": list(bot.cached_messages),
+        "members": [member for guild in bot.guilds for member in guild.members],
+        "users": bot.users,
+        "channels": [channel for guild in bot.guilds for channel in guild.channels],
+        "guilds": bot.guilds,
+    }
+    discord_caches = {
+        name: (len(objects), estimate(objects)) for name, objects in caches.items()
+    }
+    validation = bot.get_cog("Validation")
+    validation_caches = validation.memory_report() if validation else {}
+    rss = rss_bytes()
+    accounted = sum(
+        size for _, size in [*discord_caches.values(), *validation_caches.values()]
+    )
+    sections = {
+        "Process": {
+            "resident": format_bytes(rss) if rss else "unknown",
+            "unaccounted": format_bytes(rss - accounted) if rss else "unknown",
+            "lean mode": "on" if config.LEAN_MODE else "off",
+            "message cache": str(config.MAX_MESSAGES or "disabled"),
+        },
+        "discord.py caches": {
+            name: f"{count} · {format_bytes(size)}"
+            for name, (count, size) in discord_caches.items()
+        },
+        "Validation caches": {
+            name: f"{count} · {format_bytes(size)}"
+            for name, (count, size) in validation_caches.items()
+        },
+    }
+    return {heading: stats for heading, stats in sections.items() if stats}
+
+
+class Stats(commands.Cog):
+    def __init__(self, bot: commands.Bot):
+        self.__bot = bot
+        self.__server = MetricsServer(metrics, config.METRICS_PORT)
+        if metrics.enabled and config.METRICS_PORT:
+            bot.loop.create_task(self.__server.start())
+        if metrics.enabled and config.METRICS_FILE:
+            self.export.change_interval(seconds=config.METRICS_INTERVAL)
+            self.export.start()
+
+    def cog_unload(self):
+        self.export.cancel()
+        self.__server.close()
+
+    @commands.command()
+    @commands.guild_only()
+    async def leaderboard(self, ctx: commands.Context):
+        """Show the players with the most moves and kills"""
+        game = self.__game_in(ctx)
+        if game is None:
+            return await ctx.send("There is no game in this server.")
+        sections = {
+            "Most moves": dict(game.stats.leaders(game.stats.moves_by_player)),
+            "Most kills": dict(game.stats.leaders(game.stats.kills_by_player)),
+        }
+        sections = {
+            heading: leaders or {"nobody": "yet"}
+            for heading, leaders in sections.items()
+        }
+        await ctx.send(embed=stats_embed("Leaderboard", sections))
+
+    @commands.command()
+    @commands.has_permissions(administrator=True)
+    async def memory(self, ctx: commands.Context):
+        """Show the resident memory of the bot broken down by cache
+        Cache sizes are estimated from a sample of their objects
+        """
+        await ctx.send(embed=stats_embed("Memory", memory_sections(self.__bot)))
+
+    @tasks.loop(seconds=15)
+    async def export(self):
+        """Write the metrics file"""
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(
+            None, write_metrics, config.METRICS_FILE, metrics.render()
+        )
+
+    def __game_in(self, ctx: commands.Context) -> Optional[Game]:
+        """Returns the game of the channel or guild of the command"""
+        validation = self.__bot.get_cog("Validation")
+        return validation.game_in(ctx) if validation is not None else None
+
+    @commands.group(invoke_without_command=True)
+    @commands.guild_only()
+    async def stats(self, ctx: commands.Context):
+        """Show statistics of the game
+        ```
+        >stats
+        >stats player @someone
+        >stats item Pineapple
+        ```
+        """
+        game = self.__game_in(ctx)
+        if game is None:
+            return await ctx.send("There is no game in this server.")
+        await ctx.send(embed=stats_embed("Game statistics", overview(game)))
+
+    @stats.command(name="player")
+    @commands.guild_only()
+    async def stats_player(
+        self, ctx: commands.Context, member: Optional[discord.Member] = None
+    ):
+        """Show the moves and kills of a player"""
+        game = self.__game_in(ctx)
+        if game is None:
+            return await ctx.send("There is no game in this server.")
+        member = member or ctx.author
+        sections = player_sections(game.stats, member.id)
+        await ctx.send(
+            embed=stats_embed(f"Statistics of {member.display_name}", sections)
+        )
+
+    @stats.command(name="item")
+    @commands.guild_only()
+    async def stats_item(self, ctx: commands.Context, *, name: str):
+        """Show the count over time of an item and who killed it"""
+        game = self.__game_in(ctx)
+        if game is None:
+            return await ctx.send("There is no game in this server.")
+        item = game.ruleset.resolver.resolve(name)
+        if item is None:
+            return await ctx.send(f"Didn't recognize the item '{name}'.")
+        sections = item_sections(game.stats, item)
+        await ctx.send(embed=stats_embed(f"Statistics of {item}", sections))
+
+    @stats.command(name="pipeline")
+    @commands.has_permissions(administrator=True)
+    async def stats_pipeline(self, ctx: commands.Context):
+        """Show timings and counters of the validation pipeline"""
+        if not metrics.enabled:
+            return await ctx.send("Metrics are turned off (METRICS_ENABLED).")
+        sections = pipeline_sections() or {"Validation": {"events": "none yet"}}
+        await ctx.send(embed=stats_embed("Pipeline statistics", sections))
+
+
+# setup functions for bot
+def setup(bot: commands.Bot):
+    bot.add_cog(Stats(bot))
@@ -0,0 +1,51 @@
+import asyncio
+import os
+from typing import Optional
+
+from utils.metrics import Metrics
+
+
+def write_metrics(path: str, text: str):
+    """Replace the metrics file, so readers never see a partial write"""
+    temp = f"{path}.tmp"
+    with open(temp, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(temp, path)
+
+
+class MetricsServer:
+    """Serves the metrics in the Prometheus text format on localhost"""
+
+    def __init__(self, metrics: Metrics, port: int):
+        self.__metrics = metrics
+        self.__port = port
+        self.__server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self):
+        self.__server = await asyncio.start_server(
+            self.__respond, "127.0.0.1", self.__port
+        )
+
+    async def __respond(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ):
+        try:
+            # any request gets the metrics, so only the request line is read
+            await asyncio.wait_for(reader.readline(), 5)
+            body = self.__metrics.render().encode("utf-8")
+            writer.write(
+                b"HTTP/1.1 200 OK\r\n"
+                b"Content-Type: text/plain; version=0.0.4\r\n"
+                + f"Content-Length: {len(body)}\r\n".encode()
+                + b"Connection: close\r\n\r\n"
+                + body
+            )
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    def close(self):
+        if self.__server is not None:
+            self.__server.close()
@@ -0,0 +1,48 @@
+from typing import AsyncIterator
+
+import discord
+
+from .game import Game
+from .outbox import Outbox
+from .store import GameStore
+from .validation import message_matches_pattern, parse_cache, validate_message
+
+# save the checkpoint after this many messages that weren't moves
+checkpoint_interval = 50
+
+# most outbound calls to have waiting before validating more of the backlog
+max_pending_calls = 20
+
+
+async def iter_backlog(
+    channel: discord.TextChannel, after: int
+) -> AsyncIterator[discord.Message]:
+    """Stream the messages posted after a checkpoint, oldest first"""
+    async for message in channel.history(
+        limit=None, after=discord.Object(after), oldest_first=True
+    ):
+        yield message
+
+
+async def catch_up(game: Game, outbox: Outbox, store: GameStore):
+    """Validate the moves posted while the bot was offline, in order
+
+    The checkpoint is saved as the backlog is validated, so a restart resumes
+    where it left off instead of starting again.
+    """
+    skipped = 0
+    async for message in iter_backlog(game.channel, game.checkpoint):
+        # another process took the game over meanwhile
+        if game.dropped:
+            return
+        move = parse_cache.get(message, game.ruleset)
+        if not message_matches_pattern(move):
+            game.advance(message.id)
+            skipped += 1
+            if skipped % checkpoint_interval == 0:
+                store.save(game)
+            continue
+        # don't let reactions and notices pile up faster than they are sent
+        await outbox.wait_for_pending(max_pending_calls)
+        await validate_message(message, move, game, outbox, store)
+    store.save(game)
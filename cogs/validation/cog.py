@@ -1,10 +1,34 @@
-from typing import List
+import asyncio
+import logging
+import sqlite3
+from functools import partial
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
 import config
 import discord
-from discord.ext import commands
+from discord.ext import commands, tasks
+from discord_slash import SlashContext, cog_ext
+from discord_slash.utils.manage_commands import create_option
+from utils.embedder import error_embed, stats_embed
+from utils.memory import estimate
+from utils.metrics import metrics
+from utils.startup import startup
 
+from .catch_up import catch_up
+from .game import Game
+from .killed_list import parse_entries
+from .outbox import Outbox
+from .store import GameStore
+from .parser import ParsedMove
+from .items import ItemResolver
+from .ruleset import Ruleset, load_rulesets
+from .validation_error import ValidationError
+from .validation_queue import ValidationQueue
 from .validation import (
-    get_killed_list,
+    load_game,
+    remove_move,
+    update_killed_list,
+    parse_cache,
+    structured_move,
     validate_message,
     message_matches_pattern,
 )
@@ -13,40 +37,367 @@ from .validation import (
 class Validation(commands.Cog):
     def __init__(self, bot: commands.Bot):
         self.__bot = bot
-        self.__channel: discord.TextChannel
-        self.__chat: discord.TextChannel
+        rulesets = load_rulesets(
+            config.RULESETS_DIR,
+            [channel_id for channel_id, _ in config.GIVE_AND_TAKE_GAMES],
+        )
+        # games by the id of the channel they are played in
+        self.__games: Dict[int, Game] = {
+            channel_id: Game(channel_id, chat_id, rulesets[channel_id])
+            for channel_id, chat_id in config.GIVE_AND_TAKE_GAMES
+        }
+        self.__outbox = Outbox(bot)
+        self.__store = GameStore(config.STATE_DB)
+        self.__tasks: Set[asyncio.Task] = set()
+        # edits waiting to settle, by message id
+        self.__pending_edits: Dict[int, asyncio.Task] = {}
+        # ids of the channels of the games being loaded
+        self.__starting: Set[int] = set()
+        self.renew_claims.change_interval(seconds=config.GAME_LEASE_SECONDS / 3)
+        self.renew_claims.start()
+
+    def cog_unload(self):
+        self.renew_claims.cancel()
+        for game in self.__games.values():
+            game.close()
+            if game.ready:
+                self.__store.save_stats(game)
+        # a restarted process or another shard can take the games over right away
+        self.__store.release(config.GAME_OWNER)
+        self.__store.close()
 
     @commands.Cog.listener()
     async def on_ready(self):
-        """When bot is ready"""
+        """When bot is ready (also after reconnecting)"""
+        # games that were already loaded before reconnecting are skipped
+        games = [game for game in self.__games.values() if not game.ready]
+        if not games:
+            return
+        # load the games concurrently, since each one waits on Discord
+        with startup.phase("loading games"):
+            await asyncio.gather(*(self.__start_game(game) for game in games))
+
+    async def __start_game(self, game: Game):
+        """Load the channels, killed list and board of a game"""
+        if game.channel_id in self.__starting:
+            return
+        self.__starting.add(game.channel_id)
+        try:
+            await self.__load(game)
+        finally:
+            self.__starting.discard(game.channel_id)
+
+    async def __load(self, game: Game):
         # get give and take channel objects
-        self.__channel = self.__bot.get_channel(config.GIVE_AND_TAKE_CHANNEL)
-        self.__chat = self.__bot.get_channel(config.GIVE_AND_TAKE_CHAT_CHANNEL)
+        game.channel = self.__bot.get_channel(game.channel_id)
+        game.chat = self.__bot.get_channel(game.chat_id)
         # check that channel exists
-        assert isinstance(self.__channel, discord.TextChannel)
-        assert isinstance(self.__chat, discord.TextChannel)
-        # get pinned list of killed items
-        self.__killed_list = await get_killed_list(self.__chat)
+        if not isinstance(game.channel, discord.TextChannel) or not isinstance(
+            game.chat, discord.TextChannel
+        ):
+            print(f"Channels for the game in {game.channel_id} were not found.")
+            return
+        # the store is shared by the bot's processes, and only one runs a game
+        if not await self.__claim(game):
+            print(f"The game in {game.channel_id} is run by another process.")
+            return
+        # restore killed list and board from the local store
+        await load_game(game, self.__store, self.__bot.user)
+        # validate moves posted while the bot was offline
+        if game.checkpoint is not None:
+            game.buffered = []
+            self.__spawn(self.__catch_up(game))
+
+    @tasks.loop(seconds=20)
+    async def renew_claims(self):
+        """Keep the games of this process from being claimed by another one,
+        and take over the games of its guilds whose owner stopped renewing them
+        """
+        for game in list(self.__games.values()):
+            if game.channel_id in self.__starting:
+                continue
+            if game.ready:
+                if not await self.__claim(game):
+                    # the claim expired and another process took the game over,
+                    # or the store couldn't confirm the claim
+                    print(f"The game in {game.channel_id} is no longer run here.")
+                    self.__drop(game)
+            elif (
+                self.__bot.is_ready()
+                and self.__bot.get_channel(game.channel_id) is not None
+                and self.__bot.get_channel(game.chat_id) is not None
+                and await self.__claim(game)
+            ):
+                print(f"Taking over the game in {game.channel_id}.")
+                self.__spawn(self.__start_game(game))
+
+    async def __claim(self, game: Game) -> bool:
+        """Claim or renew the ownership of a game
+        Returns False if it can't be confirmed, so the game isn't run twice
+        """
+        try:
+            return await self.__store.claim(
+                game.channel_id, config.GAME_OWNER, config.GAME_LEASE_SECONDS
+            )
+        except sqlite3.Error as error:
+            logging.warning(f"Couldn't claim the game in {game.channel_id}: {error!r}")
+            return False
+
+    def __drop(self, game: Game):
+        """Stop running a game, keeping only its ids so it can be taken back"""
+        game.dropped = True
+        game.close()
+        self.__games[game.channel_id] = Game(
+            game.channel_id, game.chat_id, game.ruleset
+        )
+
+    async def __catch_up(self, game: Game):
+        """Validate the backlog of a game, then the events buffered meanwhile"""
+        try:
+            await catch_up(game, self.__outbox, self.__store)
+        except Exception:
+            await self.__bot.on_error("catch_up")
+        # keep buffering until the buffer is empty so the order is preserved
+        while game.buffered and not game.dropped:
+            event, message, job = game.buffered.pop(0)
+            # new messages already validated as part of the backlog
+            if event == "on_message" and message.id <= (game.checkpoint or 0):
+                continue
+            await self.__queue(game).put(event, message, job)
+        game.buffered = None
+
+    def __game_of(self, channel_id: int) -> Optional[Game]:
+        """Returns the game played in a channel if it is ready"""
+        game = self.__games.get(channel_id)
+        return game if game is not None and game.ready else None
 
     @commands.Cog.listener()
     async def on_message(self, message: discord.Message):
         """When a message is received in the channel"""
-        if message.channel != self.__channel:
+        # the bot only posts moves made with /move, which are validated as posted
+        if message.author == self.__bot.user:
+            return
+        game = self.__game_of(message.channel.id)
+        if game is None:
+            return
+        metrics.inc("events_seen_total", event="on_message")
+        # skip messages that can't be a move before running any regex
+        if "-" not in message.content:
             return
         # skip validation if message does not match pattern
-        if not message_matches_pattern(message):
+        with metrics.timer("stage_seconds", stage="parse"):
+            move = parse_cache.get(message, game.ruleset)
+        if not message_matches_pattern(move):
             return
-        await validate_message(message, self.__chat, self.__killed_list, self.__bot)
+        metrics.inc("events_matched_total", event="on_message")
+        await self.__enqueue(
+            game, "on_message", message, self.__validation(game, message, move)
+        )
+
+    @cog_ext.cog_slash(
+        name="move",
+        description="Give a point to one item and take a point from another",
+        options=[
+            create_option("plus", "The item to give a point to", str, True),
+            create_option("minus", "The item to take a point from", str, True),
+        ],
+    )
+    async def move(self, ctx: SlashContext, plus: str, minus: str):
+        """Make a move without typing the board"""
+        game = self.__game_of(ctx.channel_id)
+        if game is None or game.catching_up:
+            return await ctx.send(
+                "Moves can only be made in a game channel once the bot is ready.",
+                hidden=True,
+            )
+        metrics.inc("events_seen_total", event="on_slash_command")
+        # answer right away, and only to the player, if the move can't be made
+        # (the first board may still be queued, then the move is checked there)
+        board = self.__board(game)
+        if board is not None:
+            try:
+                structured_move(board, game.ruleset, plus, minus)
+            except ValidationError as error:
+                return await ctx.send(error.message, hidden=True)
+        # the board is posted once the moves queued before it are validated,
+        # so queue it before the messages that arrive while deferring
+        deferred = self.__spawn(ctx.defer())
+        await self.__enqueue(
+            game,
+            "on_slash_command",
+            ctx,
+            partial(self.__post_move, game, ctx, deferred, plus, minus),
+        )
+
+    async def __post_move(
+        self,
+        game: Game,
+        ctx: SlashContext,
+        deferred: asyncio.Task,
+        plus: str,
+        minus: str,
+    ):
+        """Post the board of a /move and validate it like a typed move"""
+        await deferred
+        try:
+            text, move = structured_move(self.__board(game), game.ruleset, plus, minus)
+        except ValidationError as error:
+            # a move validated while this one was queued changed the board
+            return await ctx.send(error.message)
+        message = await ctx.send(text)
+        # credit the move to the player rather than to the bot
+        message.author = ctx.author
+        metrics.inc("events_matched_total", event="on_slash_command")
+        await validate_message(message, move, game, self.__outbox, self.__store)
+
+    @staticmethod
+    def __board(game: Game) -> Optional[Dict[str, int]]:
+        """The board of the latest move, or None if the game state is cold"""
+        current = game.state.current
+        return current.outcome.board if current is not None else None
 
     @commands.Cog.listener()
     async def on_message_edit(self, _, message: discord.Message):
-        """When last message is edited in the channel"""
-        if message.channel != self.__channel:
+        """When a cached message is edited in the channel"""
+        # the bot only edits the response to a /move, validated as it is posted
+        if message.author == self.__bot.user:
             return
-        # skip validation if message does not match pattern
-        if not message_matches_pattern(message):
+        game = self.__game_of(message.channel.id)
+        if game is None:
+            return
+        metrics.inc("events_seen_total", event="on_message_edit")
+        self.__debounce(message.id, partial(self.__edited, game, message))
+
+    @commands.Cog.listener()
+    async def on_raw_message_edit(self, payload: discord.RawMessageUpdateEvent):
+        """When a message that isn't in the message cache is edited"""
+        parse_cache.discard(payload.message_id)
+        # cached messages are handled by on_message_edit
+        if payload.cached_message is not None:
+            return
+        author = payload.data.get("author") or {}
+        if author.get("id") == str(self.__bot.user.id):
+            return
+        game = self.__game_of(payload.channel_id)
+        if game is None or "content" not in payload.data:
+            return
+        metrics.inc("events_seen_total", event="on_raw_message_edit")
+        # only fetch edits that can be a move or that change a move
+        if (
+            "-" not in payload.data["content"]
+            and game.state.get(payload.message_id) is None
+        ):
             return
-        await validate_message(message, self.__chat, self.__killed_list, self.__bot)
+        self.__debounce(
+            payload.message_id, partial(self.__fetch_edited, game, payload.message_id)
+        )
+
+    async def __fetch_edited(self, game: Game, message_id: int):
+        """Fetch an edited message once it settled, then validate it"""
+        try:
+            message = await game.channel.fetch_message(message_id)
+        except discord.NotFound:
+            return
+        await self.__edited(game, message)
+
+    async def __edited(self, game: Game, message: discord.Message):
+        """Queue the validation of an edited message"""
+        with metrics.timer("stage_seconds", stage="parse"):
+            move = parse_cache.get(message, game.ruleset)
+        if message_matches_pattern(move):
+            metrics.inc("events_matched_total", event="on_message_edit")
+            job = self.__validation(game, message, move)
+        # a move was edited so that it is no longer a move
+        elif game.state.get(message.id) is not None:
+            job = partial(remove_move, message.id, game, self.__outbox, self.__store)
+        else:
+            return
+        await self.__enqueue(game, "on_message_edit", message, job)
+
+    def __validation(
+        self, game: Game, message: discord.Message, move: ParsedMove
+    ) -> Callable[[], Awaitable[None]]:
+        """Returns a job that validates a move"""
+        return partial(
+            validate_message, message, move, game, self.__outbox, self.__store
+        )
+
+    def __debounce(self, message_id: int, settled: Callable[[], Awaitable[None]]):
+        """Handle an edit once the message hasn't been edited for a moment"""
+        pending = self.__pending_edits.pop(message_id, None)
+        if pending is not None:
+            pending.cancel()
+        self.__pending_edits[message_id] = self.__spawn(
+            self.__settle(message_id, settled)
+        )
+
+    async def __settle(self, message_id: int, settled: Callable[[], Awaitable[None]]):
+        await asyncio.sleep(config.EDIT_DEBOUNCE_SECONDS)
+        # later edits can no longer cancel the edit once it is being handled
+        del self.__pending_edits[message_id]
+        try:
+            await settled()
+        except Exception:
+            await self.__bot.on_error("on_message_edit")
+
+    async def __enqueue(
+        self,
+        game: Game,
+        event: str,
+        message: Any,
+        job: Callable[[], Awaitable[None]],
+    ):
+        """Queue a job for the game, or buffer it during catch-up"""
+        if game.dropped:
+            return
+        if game.catching_up:
+            game.buffered.append((event, message, job))
+            return
+        await self.__queue(game).put(event, message, job)
+
+    def __queue(self, game: Game) -> ValidationQueue:
+        """Returns the validation queue of a game"""
+        return game.queue(self.__bot, config.VALIDATION_QUEUE_SIZE)
+
+    def __spawn(self, coro: Awaitable) -> asyncio.Task:
+        """Run a coroutine in the background, keeping a reference to it"""
+        task = asyncio.create_task(coro)
+        self.__tasks.add(task)
+        task.add_done_callback(self.__tasks.discard)
+        return task
+
+    @commands.Cog.listener()
+    async def on_raw_message_delete(self, payload: discord.RawMessageDeleteEvent):
+        """Re-validate the moves after a deleted move"""
+        parse_cache.discard(payload.message_id)
+        await self.__remove(payload.channel_id, payload.message_id, payload)
+
+    @commands.Cog.listener()
+    async def on_raw_bulk_message_delete(
+        self, payload: discord.RawBulkMessageDeleteEvent
+    ):
+        """Re-validate the moves after deleted moves"""
+        for message_id in sorted(payload.message_ids):
+            parse_cache.discard(message_id)
+            await self.__remove(payload.channel_id, message_id, payload)
+
+    async def __remove(self, channel_id: int, message_id: int, payload: Any):
+        """Queue the removal of a deleted move"""
+        game = self.__game_of(channel_id)
+        if game is None:
+            return
+        # a pending edit of the move no longer matters
+        pending = self.__pending_edits.pop(message_id, None)
+        if pending is not None:
+            pending.cancel()
+        if game.state.get(message_id) is None and not game.catching_up:
+            return
+        await self.__enqueue(
+            game,
+            "on_raw_message_delete",
+            payload,
+            partial(remove_move, message_id, game, self.__outbox, self.__store),
+        )
 
     @commands.command()
     @commands.has_permissions(administrator=True)
@@ -59,13 +410,104 @@ class Validation(commands.Cog):
         28.) Shrimp
         ```
         """
-        # make sure it's the same guild as the command
-        if ctx.message.guild != self.__killed_list.guild:
+        # find the game in the same guild as the command
+        game = self.game_in(ctx)
+        if game is None:
             return
         # remove command part
         new_content = ctx.message.content.replace(ctx.prefix + ctx.invoked_with, "")
         # update killed list
-        await self.__killed_list.edit(content=new_content.strip())
+        pages = game.killed_list.replace(parse_entries(new_content))
+        await update_killed_list(game, self.__outbox, pages)
+        self.__store.save(game)
+
+    def memory_report(self) -> Dict[str, Tuple[int, int]]:
+        """Returns the number of objects and estimated bytes of each cache"""
+        caches = {
+            "parsed messages": parse_cache.moves(),
+            "move records": [
+                record
+                for game in self.__games.values()
+                for record in game.state.records()
+            ],
+            "statistics": [game.stats for game in self.__games.values()],
+            "killed lists": [
+                game.killed_list for game in self.__games.values() if game.ready
+            ],
+        }
+        # rulesets are shared by every move parsed with them
+        shared = (Ruleset, ItemResolver)
+        return {
+            name: (len(objects), estimate(objects, shared=shared))
+            for name, objects in caches.items()
+        }
+
+    def game_in(self, ctx: commands.Context) -> Optional[Game]:
+        """Returns the game played or discussed in the channel of the command,
+        or the only game in its guild"""
+        in_guild = [
+            game
+            for game in self.__games.values()
+            if game.ready and game.channel.guild == ctx.guild
+        ]
+        for game in in_guild:
+            if ctx.channel.id in (game.channel_id, game.chat_id):
+                return game
+        return in_guild[0] if len(in_guild) == 1 else None
+
+    @commands.command()
+    @commands.has_permissions(administrator=True)
+    async def reloadrules(self, ctx: commands.Context):
+        """Reload the rulesets of all games from their files
+        Games keep their current rules if any ruleset is invalid
+        """
+        # read and compile the rulesets without blocking the event loop
+        loop = asyncio.get_running_loop()
+        try:
+            rulesets = await loop.run_in_executor(
+                None, load_rulesets, config.RULESETS_DIR, list(self.__games)
+            )
+        except ValueError as error:
+            return await ctx.send(
+                embed=error_embed("Rulesets were not reloaded", str(error))
+            )
+        # swap in the new rulesets all at once
+        for channel_id, game in self.__games.items():
+            game.ruleset = rulesets[channel_id]
+        parse_cache.clear()
+        loaded = {
+            f"#{game.channel.name if game.channel else game.channel_id}": (
+                f"{game.ruleset.name} ({len(game.ruleset.choices)} items)"
+            )
+            for game in self.__games.values()
+        }
+        await ctx.send(embed=stats_embed("Rulesets reloaded", {"Games": loaded}))
+
+    @commands.command()
+    @commands.has_permissions(administrator=True)
+    async def cachestats(self, ctx: commands.Context):
+        """Show item resolver and parsed message cache statistics"""
+        sections = {
+            f"Items in #{game.channel.name} ({game.ruleset.name})": (
+                game.ruleset.resolver.stats()
+            )
+            for game in self.__games.values()
+            if game.ready and game.channel.guild == ctx.guild
+        }
+        sections["Parsed messages"] = parse_cache.stats()
+        await ctx.send(embed=stats_embed("Cache statistics", sections))
+
+    @commands.command()
+    @commands.has_permissions(administrator=True)
+    async def queue(self, ctx: commands.Context):
+        """Show the validation queue and outbound Discord calls"""
+        sections = {
+            f"#{game.channel.name}": game.queue_stats()
+            for game in self.__games.values()
+            if game.ready and game.channel.guild == ctx.guild
+        }
+        sections["Outbound calls"] = self.__outbox.stats()
+        await ctx.send(embed=stats_embed("Queue statistics", sections))
 
 
 def setup(bot):
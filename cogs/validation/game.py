@@ -0,0 +1,86 @@
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import discord
+from discord.ext import commands
+
+from .game_state import GameState
+from .game_stats import GameStats
+from .killed_list import KilledList
+from .ruleset import Ruleset
+from .validation_queue import ValidationQueue
+
+
+class Game:
+    """A give and take game played in one channel
+
+    Only ids are kept until the bot is ready, and the validation queue is
+    created on the first move, so an idle game takes up very little memory.
+    While the game is catching up on moves posted while the bot was offline,
+    new events are kept in `buffered` and validated afterwards.
+    """
+
+    __slots__ = (
+        "channel_id",
+        "chat_id",
+        "ruleset",
+        "channel",
+        "chat",
+        "killed_list",
+        "state",
+        "stats",
+        "checkpoint",
+        "buffered",
+        "dropped",
+        "__queue",
+    )
+
+    def __init__(self, channel_id: int, chat_id: int, ruleset: Ruleset):
+        self.channel_id = channel_id
+        self.chat_id = chat_id
+        # replaced as a whole when rulesets are reloaded
+        self.ruleset = ruleset
+        self.channel: Optional[discord.TextChannel] = None
+        self.chat: Optional[discord.TextChannel] = None
+        self.killed_list: Optional[KilledList] = None
+        self.state = GameState()
+        self.stats = GameStats()
+        # id of the last message that was checked
+        self.checkpoint: Optional[int] = None
+        self.buffered: Optional[
+            List[Tuple[str, Any, Callable[[], Awaitable[None]]]]
+        ] = None
+        # set once another process took the game over, so that nothing left
+        # running for it saves or validates anything
+        self.dropped = False
+        self.__queue: Optional[ValidationQueue] = None
+
+    @property
+    def ready(self) -> bool:
+        """Whether the channels and killed list have been loaded"""
+        return self.killed_list is not None
+
+    @property
+    def catching_up(self) -> bool:
+        """Whether moves posted while the bot was offline are being validated"""
+        return self.buffered is not None
+
+    def advance(self, message_id: int):
+        """Move the checkpoint forward to a message that was checked"""
+        if self.checkpoint is None or message_id > self.checkpoint:
+            self.checkpoint = message_id
+
+    def queue(self, bot: commands.Bot, maxsize: int) -> ValidationQueue:
+        """Returns the validation queue of the game, creating it if needed"""
+        if self.__queue is None:
+            self.__queue = ValidationQueue(bot, maxsize)
+        return self.__queue
+
+    def queue_stats(self) -> Dict[str, str]:
+        """Returns the statistics of the validation queue"""
+        return self.__queue.stats() if self.__queue is not None else {"depth": "idle"}
+
+    def close(self):
+        """Stop validating moves"""
+        if self.__queue is not None:
+            self.__queue.close()
+            self.__queue = None
@@ -0,0 +1,100 @@
+from bisect import bisect_left, bisect_right, insort
+from typing import Dict, List, NamedTuple, Optional
+
+import discord
+
+from .parser import ParsedMove
+
+
+class Outcome(NamedTuple):
+    """Result of validating a move"""
+
+    valid: bool
+    problem: Optional[str]
+    # board listed in the move (None if its items weren't recognized)
+    board: Optional[Dict[str, int]]
+    remaining: int
+    # item killed by the move
+    death: Optional[str]
+
+
+class MoveRecord(NamedTuple):
+    """A validated move and its outcome"""
+
+    message_id: int
+    # message and parsed move (None if restored from a saved snapshot)
+    message: Optional[discord.Message]
+    move: Optional[ParsedMove]
+    outcome: Outcome
+
+
+class GameState:
+    """In-memory chain of the most recently validated moves, oldest first
+
+    Every move after the first one in the chain is recorded, valid or not, so
+    the chain has no gaps and each move can be checked against the board of
+    the move before it without reading the channel history.
+    """
+
+    def __init__(self, max_moves: int = 100):
+        self.__max_moves = max_moves
+        self.__ids: List[int] = []
+        self.__records: Dict[int, MoveRecord] = {}
+
+    @property
+    def current(self) -> Optional[MoveRecord]:
+        """The most recent move"""
+        return self.__records[self.__ids[-1]] if self.__ids else None
+
+    def records(self) -> List[MoveRecord]:
+        """Returns the moves in the chain, oldest first"""
+        return [self.__records[i] for i in self.__ids]
+
+    def get(self, message_id: int) -> Optional[MoveRecord]:
+        return self.__records.get(message_id)
+
+    def board_before(self, message_id: int) -> Optional[Dict[str, int]]:
+        """Returns the board to validate a move against
+        Returns None if the state is cold and history must be used instead
+        """
+        previous = self.before(message_id)
+        return previous.outcome.board if previous is not None else None
+
+    def before(self, message_id: int) -> Optional[MoveRecord]:
+        """Returns the move before a message, or None if the state is cold"""
+        index = bisect_left(self.__ids, message_id)
+        return self.__records[self.__ids[index - 1]] if index else None
+
+    def after(self, message_id: int) -> List[MoveRecord]:
+        """Returns the moves after a message, oldest first"""
+        index = bisect_right(self.__ids, message_id)
+        return [self.__records[i] for i in self.__ids[index:]]
+
+    def record(
+        self, message: discord.Message, move: ParsedMove, outcome: Outcome
+    ) -> Optional[MoveRecord]:
+        """Record the outcome of a move and return the previous record of it"""
+        # moves before the start of the chain would leave a gap
+        if self.__ids and message.id < self.__ids[0]:
+            return None
+        previous = self.__records.get(message.id)
+        if previous is None:
+            insort(self.__ids, message.id)
+        self.__records[message.id] = MoveRecord(message.id, message, move, outcome)
+        # forget the oldest moves
+        while len(self.__ids) > self.__max_moves:
+            del self.__records[self.__ids.pop(0)]
+        return previous
+
+    def remove(self, message_id: int) -> Optional[MoveRecord]:
+        """Remove a deleted move and return its record"""
+        record = self.__records.pop(message_id, None)
+        if record is not None:
+            self.__ids.remove(message_id)
+        return record
+
+    def restore(self, message_id: int, board: Dict[str, int], remaining: int):
+        """Restore the board of the last validated move from a saved snapshot"""
+        outcome = Outcome(True, None, board, remaining, None)
+        self.__ids = [message_id]
+        self.__records = {message_id: MoveRecord(message_id, None, None, outcome)}
@@ -0,0 +1,185 @@
+import base64
+import json
+from array import array
+from collections import Counter
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import discord
+
+from .game_state import Outcome
+
+# save the statistics after this many changes
+save_interval = 20
+
+
+class Death(NamedTuple):
+    """When and by whom an item was killed"""
+
+    placement: int
+    player_id: int
+    # number of accepted moves the item survived
+    moves: int
+    # seconds between the first accepted move and the death
+    seconds: float
+
+
+class Trajectory:
+    """Count of an item after each accepted move that changed it
+
+    Only changes are stored, in two parallel arrays, so an item costs a few
+    bytes per change instead of an entry for every move of the game.
+    """
+
+    __slots__ = ("moves", "counts")
+
+    def __init__(self, moves: Optional[array] = None, counts: Optional[array] = None):
+        self.moves = moves if moves is not None else array("I")
+        self.counts = counts if counts is not None else array("h")
+
+    def add(self, move: int, count: int):
+        if self.counts and self.counts[-1] == count:
+            return
+        self.moves.append(move)
+        self.counts.append(count)
+
+    @property
+    def last(self) -> Optional[int]:
+        return self.counts[-1] if self.counts else None
+
+
+class GameStats:
+    """Player and item statistics, updated as each move is accepted
+
+    Corrections made by editing or deleting a move adjust the counters of
+    moves, players and kills. Trajectories keep the counts as they were first
+    accepted.
+    """
+
+    def __init__(self):
+        # accepted moves
+        self.moves = 0
+        self.started_at: Optional[float] = None
+        self.players: Dict[int, str] = {}
+        self.moves_by_player: Counter = Counter()
+        self.invalid_by_player: Counter = Counter()
+        self.kills_by_player: Counter = Counter()
+        self.deaths: Dict[str, Death] = {}
+        self.trajectories: Dict[str, Trajectory] = {}
+        # newest move added to the trajectories
+        self.last_recorded = 0
+        # changes since the statistics were last saved
+        self.changes = 0
+
+    @property
+    def needs_saving(self) -> bool:
+        return self.changes >= save_interval
+
+    def record(
+        self,
+        message: discord.Message,
+        outcome: Outcome,
+        previous: Optional[Outcome],
+    ):
+        """Count a validated move, or the change of outcome of an edited move"""
+        player = message.author
+        self.players[player.id] = player.display_name
+        was_valid = previous is not None and previous.valid
+        if outcome.valid and not was_valid:
+            self.moves += 1
+            self.moves_by_player[player.id] += 1
+            if self.started_at is None:
+                self.started_at = message.created_at.timestamp()
+            # a move accepted again after an edit is already in the trajectories
+            if message.id > self.last_recorded:
+                self.last_recorded = message.id
+                for item, count in outcome.board.items():
+                    trajectory = self.trajectories.setdefault(item, Trajectory())
+                    trajectory.add(self.moves, count)
+        elif was_valid and not outcome.valid:
+            self.moves -= 1
+            self.moves_by_player[player.id] -= 1
+        if not outcome.valid and previous is None:
+            self.invalid_by_player[player.id] += 1
+        self.changes += 1
+
+    def forget(self, message: Optional[discord.Message], outcome: Outcome):
+        """Uncount a deleted move"""
+        if message is not None and outcome.valid:
+            self.moves -= 1
+            self.moves_by_player[message.author.id] -= 1
+            self.changes += 1
+
+    def record_death(self, message: discord.Message, item: str, placement: int):
+        started_at = self.started_at or message.created_at.timestamp()
+        self.deaths[item] = Death(
+            placement,
+            message.author.id,
+            self.moves,
+            message.created_at.timestamp() - started_at,
+        )
+        self.kills_by_player[message.author.id] += 1
+        # deaths are saved right away
+        self.changes = save_interval
+
+    def forget_death(self, item: str):
+        death = self.deaths.pop(item, None)
+        if death is not None:
+            self.kills_by_player[death.player_id] -= 1
+            self.changes = save_interval
+
+    def leaders(self, counter: Counter, limit: int = 10) -> List[Tuple[str, int]]:
+        """Returns the names and counts of the players with the highest counts"""
+        return [
+            (self.players.get(player_id, str(player_id)), count)
+            for player_id, count in counter.most_common(limit)
+            if count > 0
+        ]
+
+    def dump(self) -> str:
+        """Serialize the statistics, with trajectories packed as base64 arrays"""
+        self.changes = 0
+        return json.dumps(
+            {
+                "moves": self.moves,
+                "started_at": self.started_at,
+                "players": self.players,
+                "moves_by_player": self.moves_by_player,
+                "invalid_by_player": self.invalid_by_player,
+                "kills_by_player": self.kills_by_player,
+                "deaths": self.deaths,
+                "last_recorded": self.last_recorded,
+                "trajectories": {
+                    item: [pack(t.moves), pack(t.counts)]
+                    for item, t in self.trajectories.items()
+                },
+            },
+            separators=(",", ":"),
+        )
+
+    @classmethod
+    def load(cls, text: str) -> "GameStats":
+        data = json.loads(text)
+        stats = cls()
+        stats.moves = data["moves"]
+        stats.started_at = data["started_at"]
+        stats.players = {int(k): v for k, v in data["players"].items()}
+        for name in ("moves_by_player", "invalid_by_player", "kills_by_player"):
+            setattr(stats, name, Counter({int(k): v for k, v in data[name].items()}))
+        stats.deaths = {item: Death(*death) for item, death in data["deaths"].items()}
+        # older versions didn't save it
+        stats.last_recorded = data.get("last_recorded", 0)
+        stats.trajectories = {
+            item: Trajectory(unpack("I", moves), unpack("h", counts))
+            for item, (moves, counts) in data["trajectories"].items()
+        }
+        return stats
+
+
+def pack(values: array) -> str:
+    return base64.b64encode(values.tobytes()).decode("ascii")
+
+
+def unpack(typecode: str, text: str) -> array:
+    values = array(typecode)
+    values.frombytes(base64.b64decode(text))
+    return values
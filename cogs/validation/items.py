@@ -0,0 +1,82 @@
+import re
+import unicodedata
+from functools import lru_cache
+from typing import Dict, Iterable, Optional
+
+from fuzzywuzzy import process
+
+non_alphanumeric_regex = re.compile(r"[^a-z0-9]+")
+
+
+def fold(name: str) -> str:
+    """Lowercase the name and strip accents and punctuation"""
+    # remove accents (jalapeño -> jalapeno)
+    name = unicodedata.normalize("NFKD", name)
+    name = "".join(c for c in name if not unicodedata.combining(c))
+    return non_alphanumeric_regex.sub(" ", name.lower()).strip()
+
+
+def normalize(name: str) -> str:
+    """Fold the name and singularize it"""
+    name = fold(name)
+    # singularize the last word (anchovies -> anchovy, tomatoes -> tomato)
+    if name.endswith("ies"):
+        return name[:-3] + "y"
+    if name.endswith("oes"):
+        return name[:-2]
+    if name.endswith("s") and not name.endswith("ss"):
+        return name[:-1]
+    return name
+
+
+class ItemResolver:
+    """Resolves the name of an item typed by a player to one of the choices
+
+    Names are first looked up in a precomputed index of normalized names and
+    aliases. Only unknown names fall back to fuzzy matching, and the results
+    of fuzzy matching are kept in a bounded LRU cache.
+    """
+
+    def __init__(
+        self,
+        choices: Iterable[str],
+        aliases: Optional[Dict[str, Iterable[str]]] = None,
+        threshold: int = 50,
+        cache_size: int = 1024,
+    ):
+        self.choices = list(choices)
+        self.threshold = threshold
+        self.__index: Dict[str, str] = {normalize(c): c for c in self.choices}
+        for choice, names in (aliases or {}).items():
+            for name in names:
+                self.__index.setdefault(normalize(name), choice)
+        self.__fuzzy = lru_cache(maxsize=cache_size)(self.__extract)
+        self.exact_hits = 0
+
+    def resolve(self, name: str) -> Optional[str]:
+        """Returns the matching choice or None if the name wasn't recognized"""
+        folded = fold(name)
+        choice = self.__index.get(normalize(folded))
+        if choice is not None:
+            self.exact_hits += 1
+            return choice
+        # singularizing a misspelled name would change what it is closest to
+        return self.__fuzzy(folded)
+
+    def __extract(self, name: str) -> Optional[str]:
+        """Find the closest choice using fuzzy matching"""
+        choice = process.extractOne(name, self.choices)
+        # check fuzz
+        if not choice or choice[1] < self.threshold:
+            return None
+        return choice[0]
+
+    def stats(self) -> Dict[str, int]:
+        """Returns counters for exact hits, cache hits and fuzzy fallbacks"""
+        info = self.__fuzzy.cache_info()
+        return {
+            "exact hits": self.exact_hits,
+            "cache hits": info.hits,
+            "fuzzy fallbacks": info.misses,
+            "cache size": info.currsize,
+        }
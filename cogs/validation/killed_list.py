@@ -0,0 +1,111 @@
+import re
+from typing import Dict, List, Optional
+
+import discord
+
+entry_regex = re.compile(r"^\s*(\d+)\.\)\s*(.+?)\s*$", re.MULTILINE)
+
+killed_list_placeholder = "Killed list will appear here"
+
+page_limit = 2000
+
+
+def parse_entries(text: str) -> Dict[int, str]:
+    """Returns the killed items by placement from the text of a killed list"""
+    return {int(match[1]): match[2] for match in entry_regex.finditer(text)}
+
+
+def render_entries(entries: Dict[int, str]) -> str:
+    """Write entries with the most recent death (lowest placement) first"""
+    return "\n".join(
+        f"{placement}.) {entries[placement]}" for placement in sorted(entries)
+    )
+
+
+class KilledList:
+    """The items killed so far, rendered across as many pinned pages as needed
+
+    Entries can be looked up by placement and by item in constant time. Each
+    page remembers which entries it shows, so adding an entry only changes
+    the newest page (or starts a new one when it is full).
+    """
+
+    def __init__(self, pages: List[discord.Message]):
+        # pinned messages, oldest first
+        self.pages = pages
+        self.by_placement: Dict[int, str] = {}
+        self.by_item: Dict[str, int] = {}
+        self.__page_entries: List[Dict[int, str]] = []
+        for page in pages:
+            entries = parse_entries(page.content)
+            self.__page_entries.append(entries)
+            for placement, item in entries.items():
+                self.by_placement[placement] = item
+                self.by_item[item] = placement
+
+    def __contains__(self, item: str) -> bool:
+        return item in self.by_item
+
+    def has_placement(self, placement: int) -> bool:
+        return placement in self.by_placement
+
+    @property
+    def ids(self) -> List[int]:
+        """Ids of the pinned pages"""
+        return [page.id for page in self.pages]
+
+    def render(self, page: Optional[int] = None) -> str:
+        """Text of a page, or of all entries if no page is given"""
+        if page is None:
+            return render_entries(self.by_placement)
+        return render_entries(self.__page_entries[page]) or killed_list_placeholder
+
+    def add(self, placement: int, item: str) -> int:
+        """Add an entry and return the index of the page that changed
+        If the index is past the last page, a new page has to be pinned
+        """
+        self.by_placement[placement] = item
+        self.by_item[item] = placement
+        line = f"{placement}.) {item}"
+        if self.__page_entries:
+            last = self.__page_entries[-1]
+            if len(render_entries(last)) + len(line) + 1 <= page_limit:
+                last[placement] = item
+                return len(self.__page_entries) - 1
+        self.__page_entries.append({placement: item})
+        return len(self.__page_entries) - 1
+
+    def remove(self, item: str) -> List[int]:
+        """Remove the entry of an item and return the indexes of pages that changed"""
+        placement = self.by_item.pop(item, None)
+        if placement is None:
+            return []
+        del self.by_placement[placement]
+        for index, entries in enumerate(self.__page_entries):
+            if entries.pop(placement, None) is not None:
+                return [index]
+        return []
+
+    def replace(self, entries: Dict[int, str]) -> List[int]:
+        """Replace all entries and return the indexes of the pages that changed"""
+        before = [self.render(i) for i in range(len(self.__page_entries))]
+        self.by_placement = dict(entries)
+        self.by_item = {item: placement for placement, item in entries.items()}
+        # fill pages starting from the highest placements (the oldest deaths)
+        pages: List[Dict[int, str]] = [{}]
+        for placement in sorted(entries, reverse=True):
+            line = f"{placement}.) {entries[placement]}"
+            if (
+                pages[-1]
+                and len(render_entries(pages[-1])) + len(line) + 1 > page_limit
+            ):
+                pages.append({})
+            pages[-1][placement] = entries[placement]
+        # keep pages that are already pinned, even if they are now empty
+        pages += [{} for _ in range(len(self.pages) - len(pages))]
+        self.__page_entries = pages
+        return [
+            i
+            for i in range(len(pages))
+            if i >= len(before) or self.render(i) != before[i]
+        ]
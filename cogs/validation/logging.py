@@ -1,10 +1,16 @@
 import discord
 from utils.embedder import build_embed
 
+from .outbox import Outbox
 
-async def log_problem(author: discord.Member, channel: discord.TextChannel, text: str):
-    await channel.send(f"**Please double-check your post, {author.mention}!**\n{text}")
 
+def log_problem(
+    outbox: Outbox, author: discord.Member, channel: discord.TextChannel, text: str
+):
+    outbox.notify(
+        channel, f"**Please double-check your post, {author.mention}!**\n{text}"
+    )
 
-async def log_death(channel: discord.TextChannel, item: str, placement: int):
-    await channel.send(embed=build_embed(f"🪦 RIP {item} (#{placement})"))
+
+def log_death(outbox: Outbox, channel: discord.TextChannel, item: str, placement: int):
+    outbox.notify(channel, embed=build_embed(f"🪦 RIP {item} (#{placement})"))
@@ -0,0 +1,213 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+import discord
+from discord.ext import commands
+from utils.metrics import metrics
+
+# calls allowed per number of seconds for each kind of route (per channel)
+route_limits = {
+    "reaction": (1, 0.25),
+    "send": (5, 5.0),
+    "edit": (5, 5.0),
+}
+
+# how long to wait for more edits or notices before sending them
+coalesce_window = 0.5
+
+message_limit = 2000
+
+
+class RouteBudget:
+    """Token bucket allowing `rate` calls every `per` seconds"""
+
+    def __init__(self, rate: int, per: float):
+        self.rate = rate
+        self.per = per
+        self.__tokens = float(rate)
+        self.__updated = time.monotonic()
+        self.__lock = asyncio.Lock()
+
+    async def acquire(self):
+        """Wait until a call is allowed, in the order the calls were made"""
+        async with self.__lock:
+            while True:
+                now = time.monotonic()
+                refill = (now - self.__updated) * self.rate / self.per
+                self.__tokens = min(self.rate, self.__tokens + refill)
+                self.__updated = now
+                if self.__tokens >= 1:
+                    self.__tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.__tokens) * self.per / self.rate)
+
+
+class Outbox:
+    """Schedules the bot's reactions, edits and notices
+
+    - reactions the bot already placed are tracked, so removing a reaction
+      that was never added costs nothing
+    - several pending edits of the same message are merged into one
+    - notices sent to a channel within a short window are batched
+    - every call waits for the budget of its route before being made
+    """
+
+    def __init__(self, bot: commands.Bot, max_tracked: int = 1000):
+        self.__bot = bot
+        self.__max_tracked = max_tracked
+        self.__reactions: "OrderedDict[int, Set[str]]" = OrderedDict()
+        self.__budgets: Dict[Tuple[str, int], RouteBudget] = {}
+        self.__edits: Dict[int, Tuple[discord.Message, str]] = {}
+        self.__notices: Dict[
+            int, Tuple[discord.TextChannel, List[str], List[discord.Embed]]
+        ] = {}
+        self.__tasks: Set[asyncio.Task] = set()
+        self.calls: Dict[str, int] = {route: 0 for route in route_limits}
+        self.skipped_removals = 0
+        self.merged_edits = 0
+        self.batched_notices = 0
+
+    def set_validation(self, message: discord.Message, valid: bool):
+        """React with ✅ or 🚫, removing the opposite reaction if it was placed"""
+        emoji_add, emoji_remove = ("✅", "🚫") if valid else ("🚫", "✅")
+        self.unreact(message, emoji_remove)
+        self.react(message, emoji_add)
+
+    def react(self, message: discord.Message, emoji: str):
+        """Add a reaction unless the bot already placed it"""
+        placed = self.__placed(message)
+        if emoji in placed:
+            return
+        placed.add(emoji)
+        self.__submit(
+            "reaction", message.channel.id, lambda: message.add_reaction(emoji)
+        )
+
+    def unreact(self, message: discord.Message, emoji: str):
+        """Remove a reaction if the bot placed it"""
+        placed = self.__placed(message)
+        if emoji not in placed:
+            self.skipped_removals += 1
+            return
+        placed.discard(emoji)
+        self.__submit(
+            "reaction",
+            message.channel.id,
+            lambda: message.remove_reaction(emoji, self.__bot.user),
+        )
+
+    def __placed(self, message: discord.Message) -> Set[str]:
+        """Returns the set of reactions the bot placed on a message"""
+        placed = self.__reactions.get(message.id)
+        if placed is None:
+            # start from the reactions discord.py knows about
+            placed = {str(r.emoji) for r in message.reactions if r.me}
+            self.__reactions[message.id] = placed
+            if len(self.__reactions) > self.__max_tracked:
+                self.__reactions.popitem(last=False)
+        else:
+            self.__reactions.move_to_end(message.id)
+        return placed
+
+    def edit(self, message: discord.Message, content: str):
+        """Edit a message, merging it with any pending edit of the same message"""
+        if message.id in self.__edits:
+            self.merged_edits += 1
+            self.__edits[message.id] = (message, content)
+            return
+        self.__edits[message.id] = (message, content)
+        self.__later(self.__flush_edit(message.id))
+
+    async def __flush_edit(self, message_id: int):
+        await asyncio.sleep(coalesce_window)
+        message, content = self.__edits.pop(message_id)
+        await self.__call(
+            "edit", message.channel.id, lambda: message.edit(content=content)
+        )
+
+    def notify(
+        self,
+        channel: discord.TextChannel,
+        content: Optional[str] = None,
+        embed: Optional[discord.Embed] = None,
+    ):
+        """Send a notice to a channel, batched with other notices to the channel"""
+        pending = self.__notices.get(channel.id)
+        if pending is None:
+            pending = self.__notices[channel.id] = (channel, [], [])
+            self.__later(self.__flush_notices(channel.id))
+        else:
+            self.batched_notices += 1
+        if content:
+            pending[1].append(content)
+        if embed:
+            pending[2].append(embed)
+
+    async def __flush_notices(self, channel_id: int):
+        await asyncio.sleep(coalesce_window)
+        channel, contents, embeds = self.__notices.pop(channel_id)
+        # combine the notices into as few messages as possible
+        chunks: List[str] = []
+        for content in contents:
+            if chunks and len(chunks[-1]) + len(content) + 2 <= message_limit:
+                chunks[-1] += f"\n\n{content}"
+            else:
+                chunks.append(content[:message_limit])
+        # attach the first embed to the last text message
+        sends = [(chunk, None) for chunk in chunks] or [(None, None)]
+        if embeds:
+            sends[-1] = (sends[-1][0], embeds[0])
+        sends += [(None, embed) for embed in embeds[1:]]
+        for content, embed in sends:
+            await self.__call(
+                "send",
+                channel.id,
+                lambda c=content, e=embed: channel.send(content=c, embed=e),
+            )
+
+    def __submit(self, route: str, channel_id: int, call: Callable[[], Awaitable]):
+        """Make a call in the background once the route allows it"""
+        self.__later(self.__call(route, channel_id, call))
+
+    async def __call(self, route: str, channel_id: int, call: Callable[[], Awaitable]):
+        key = (route, channel_id)
+        budget = self.__budgets.get(key)
+        if budget is None:
+            budget = self.__budgets[key] = RouteBudget(*route_limits[route])
+        with metrics.timer("api_wait_seconds", route=route):
+            await budget.acquire()
+        self.calls[route] += 1
+        # the call itself is counted by the instrumented HTTP client
+        await call()
+
+    def __later(self, coro: Awaitable):
+        """Run a coroutine in the background, reporting errors to the bot"""
+
+        async def run():
+            try:
+                await coro
+            except discord.NotFound:
+                pass  # message was deleted in the meantime
+            except Exception:
+                await self.__bot.on_error("outbox")
+
+        task = asyncio.create_task(run())
+        self.__tasks.add(task)
+        task.add_done_callback(self.__tasks.discard)
+
+    async def wait_for_pending(self, limit: int):
+        """Wait until fewer than `limit` calls are waiting to be made"""
+        while len(self.__tasks) >= limit:
+            await asyncio.wait(set(self.__tasks), return_when=asyncio.FIRST_COMPLETED)
+
+    def stats(self) -> Dict[str, int]:
+        """Returns counters for calls made and calls saved"""
+        return {
+            **{f"{route} calls": count for route, count in self.calls.items()},
+            "skipped removals": self.skipped_removals,
+            "merged edits": self.merged_edits,
+            "batched notices": self.batched_notices,
+            "pending": len(self.__tasks),
+        }
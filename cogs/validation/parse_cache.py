@@ -0,0 +1,65 @@
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import discord
+
+from .parser import ParsedMove
+from .ruleset import Ruleset
+
+# edit time of the message, ruleset it was parsed with, and parsed move
+Entry = Tuple[Optional[datetime], Ruleset, ParsedMove]
+
+
+class ParseCache:
+    """Bounded LRU cache of parsed messages keyed by message id and edit time
+
+    A message that was edited since it was cached, or that was parsed with a
+    ruleset that has since been reloaded, is parsed again. Entries can be
+    dropped as soon as a message is edited or deleted.
+    """
+
+    def __init__(self, maxsize: int = 512):
+        self.maxsize = maxsize
+        self.__entries: "OrderedDict[int, Entry]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, message: discord.Message, ruleset: Ruleset) -> ParsedMove:
+        """Returns the parsed message, parsing it only if it isn't cached"""
+        entry = self.__entries.get(message.id)
+        if entry is not None and entry[0] == message.edited_at and entry[1] is ruleset:
+            self.hits += 1
+            self.__entries.move_to_end(message.id)
+            return entry[2]
+        self.misses += 1
+        move = ruleset.parse(message.content)
+        self.__entries[message.id] = (message.edited_at, ruleset, move)
+        self.__entries.move_to_end(message.id)
+        # remove least recently used entry
+        if len(self.__entries) > self.maxsize:
+            self.__entries.popitem(last=False)
+            self.evictions += 1
+        return move
+
+    def discard(self, message_id: int):
+        """Remove a message that was edited or deleted"""
+        self.__entries.pop(message_id, None)
+
+    def moves(self) -> List[ParsedMove]:
+        """Returns the cached moves"""
+        return [entry[2] for entry in self.__entries.values()]
+
+    def clear(self):
+        """Remove all entries"""
+        self.__entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """Returns counters for hits, misses and evictions"""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "size": len(self.__entries),
+        }
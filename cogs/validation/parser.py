@@ -0,0 +1,88 @@
+import re
+from typing import TYPE_CHECKING, Dict, List, Optional, Pattern, Tuple
+
+if TYPE_CHECKING:
+    from .items import ItemResolver
+
+# Groups:
+# 1: The name of the choice
+# 2: The current number for the choice
+# 3: '+', '-', or None
+line_regex = re.compile(r"(\w[^\d\n☠️:<]*)\s*[-]\s*(\d{0,3})\b[^+\-\n\d]*([+\-])?")
+
+
+class ParsedMove:
+    """The lines of a message, split and matched once and shared by every check
+
+    `items`, `counts` and `signs` hold one entry per listed line (a line that
+    matches the pattern and has a number or a sign). `listed` is filled in the
+    first time the item names are resolved to choices, using the resolver of
+    the ruleset the move was parsed with.
+    """
+
+    __slots__ = (
+        "matched",
+        "items",
+        "counts",
+        "signs",
+        "plus_count",
+        "minus_count",
+        "line_count",
+        "listed",
+        "resolver",
+    )
+
+    def __init__(
+        self,
+        matched: bool,
+        items: Tuple[str, ...],
+        counts: Tuple[int, ...],
+        signs: Tuple[Optional[str], ...],
+        line_count: int,
+        resolver: Optional["ItemResolver"] = None,
+    ):
+        self.matched = matched
+        self.items = items
+        self.counts = counts
+        self.signs = signs
+        self.plus_count = signs.count("+")
+        self.minus_count = signs.count("-")
+        self.line_count = line_count
+        self.listed: Optional[Dict[str, Tuple[int, Optional[str]]]] = None
+        self.resolver = resolver
+
+    def __repr__(self) -> str:
+        lines = ", ".join(
+            f"{item!r}={count}{sign or ''}"
+            for item, count, sign in zip(self.items, self.counts, self.signs)
+        )
+        return f"<ParsedMove {lines}>"
+
+
+def parse_move(
+    content: str,
+    pattern: Pattern = line_regex,
+    resolver: Optional["ItemResolver"] = None,
+) -> ParsedMove:
+    """Split the content into lines and match each line once"""
+    lines = content.split("\n")
+    matched = False
+    items: List[str] = []
+    counts: List[int] = []
+    signs: List[Optional[str]] = []
+    for line in lines:
+        match = pattern.search(line)
+        # line doesn't match pattern
+        if not match:
+            continue
+        matched = True
+        choice_input, num, sign = match.groups()
+        # line has neither a number nor a sign
+        if not (num or sign):
+            continue
+        items.append(choice_input)
+        counts.append(int(num) if num and num.isdigit() else 0)
+        signs.append(sign)
+    return ParsedMove(
+        matched, tuple(items), tuple(counts), tuple(signs), len(lines), resolver
+    )
@@ -0,0 +1,132 @@
+import json
+import os
+import re
+from typing import Dict, List, Optional, Tuple
+
+from .items import ItemResolver
+from .parser import ParsedMove, line_regex, parse_move
+
+# how the bot writes a line of a board (sign is " +", " -" or "")
+line_format = "{item} - {count}{sign}"
+
+
+class Ruleset:
+    """Items and line format of a game
+
+    The line regex and the item lookup tables are built once when the ruleset
+    is loaded. Games hold a reference to their ruleset, so reloading swaps in
+    a new one in a single assignment without pausing validation.
+    """
+
+    __slots__ = ("name", "choices", "aliases", "line_regex", "line_format", "resolver")
+
+    def __init__(
+        self,
+        name: str,
+        choices: List[str],
+        aliases: Optional[Dict[str, List[str]]] = None,
+        threshold: int = 50,
+        line_pattern: str = line_regex.pattern,
+        line_format: str = line_format,
+    ):
+        self.name = name
+        self.choices = choices
+        self.aliases = aliases or {}
+        self.line_regex = re.compile(line_pattern)
+        if self.line_regex.groups != 3:
+            raise ValueError(
+                "The line pattern needs 3 groups: the item, the number and the sign."
+            )
+        self.line_format = line_format
+        self.resolver = ItemResolver(choices, self.aliases, threshold)
+
+    def parse(self, content: str) -> ParsedMove:
+        """Parse a message with the line format of the ruleset"""
+        return parse_move(content, self.line_regex, self.resolver)
+
+    def render(self, listed: Dict[str, Tuple[int, Optional[str]]]) -> str:
+        """Write a board the way the line pattern reads it"""
+        return "\n".join(
+            self.line_format.format(
+                item=item, count=count, sign=f" {sign}" if sign else ""
+            )
+            for item, (count, sign) in listed.items()
+        )
+
+
+def load_ruleset(path: str) -> Ruleset:
+    """Read and compile a ruleset from a JSON file
+    Raises ValueError if the file is not a valid ruleset
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        try:
+            data = json.load(f)
+        except json.JSONDecodeError as error:
+            raise ValueError(f"{path} is not valid JSON: {error}") from error
+    if not isinstance(data, dict):
+        raise ValueError(f"{path} needs an object at the top level.")
+    items = data.get("items")
+    if not is_list_of_str(items) or not items:
+        raise ValueError(f"{path} needs a list of items.")
+    aliases = data.get("aliases") or {}
+    if not isinstance(aliases, dict) or not all(
+        is_list_of_str(names) for names in aliases.values()
+    ):
+        raise ValueError(f"{path} needs the aliases as lists of names by item.")
+    unknown = [item for item in aliases if item not in items]
+    if unknown:
+        raise ValueError(f"{path} has aliases for items it doesn't list: {unknown}")
+    name = data.get("name", os.path.basename(path))
+    pattern = data.get("line_pattern", line_regex.pattern)
+    board_line = data.get("line_format", line_format)
+    for key, value in (
+        ("name", name),
+        ("line_pattern", pattern),
+        ("line_format", board_line),
+    ):
+        if not isinstance(value, str):
+            raise ValueError(f"{path} needs {key} to be a string.")
+    try:
+        board_line.format(item="", count=0, sign="")
+    except (AttributeError, KeyError, IndexError, ValueError) as error:
+        raise ValueError(
+            f"{path} has an invalid line format, it can only use"
+            " {item}, {count} and {sign}."
+        ) from error
+    try:
+        threshold = int(data.get("threshold", 50))
+    except (TypeError, ValueError) as error:
+        raise ValueError(f"{path} needs the threshold to be a number.") from error
+    try:
+        return Ruleset(name, items, aliases, threshold, pattern, board_line)
+    except re.error as error:
+        raise ValueError(f"{path} has an invalid line pattern: {error}") from error
+    except ValueError as error:
+        raise ValueError(f"{path}: {error}") from error
+
+
+def is_list_of_str(value) -> bool:
+    """Whether a value read from JSON is a list of strings"""
+    return isinstance(value, list) and all(isinstance(item, str) for item in value)
+
+
+def ruleset_path(directory: str, channel_id: int) -> str:
+    """Returns the ruleset file of a game, or the default ruleset file"""
+    path = os.path.join(directory, f"{channel_id}.json")
+    return path if os.path.exists(path) else os.path.join(directory, "default.json")
+
+
+def load_rulesets(directory: str, channel_ids: List[int]) -> Dict[int, Ruleset]:
+    """Load the ruleset of every game, or raise ValueError if any is invalid"""
+    loaded: Dict[str, Ruleset] = {}
+    rulesets: Dict[int, Ruleset] = {}
+    for channel_id in channel_ids:
+        path = ruleset_path(directory, channel_id)
+        # games sharing a file share the compiled ruleset
+        if path not in loaded:
+            try:
+                loaded[path] = load_ruleset(path)
+            except OSError as error:
+                raise ValueError(f"Couldn't read {path}: {error.strerror}") from error
+        rulesets[channel_id] = loaded[path]
+    return rulesets
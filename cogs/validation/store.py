@@ -0,0 +1,202 @@
+import asyncio
+import json
+import logging
+import sqlite3
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, NamedTuple, Optional
+
+from .game import Game
+
+
+class StoredGame(NamedTuple):
+    """Snapshot of a game saved in the local store"""
+
+    channel_id: int
+    killed_pages: List[int]
+    killed: str
+    last_message_id: Optional[int]
+    board: Optional[Dict[str, int]]
+    remaining: int
+    checkpoint: Optional[int]
+
+
+class GameStore:
+    """Saves game state in a local SQLite database for warm restarts
+
+    Writes are made on a single background thread in the order they were
+    requested, so they never block the event loop. The database is in WAL
+    mode so that several bot processes can share it, each one claiming the
+    games it runs.
+    """
+
+    def __init__(self, path: str):
+        self.__executor = ThreadPoolExecutor(max_workers=1)
+        # wait for other processes' writes instead of failing
+        self.__connection = sqlite3.connect(path, check_same_thread=False, timeout=10.0)
+        self.__connection.execute("PRAGMA journal_mode=WAL")
+        self.__connection.execute("PRAGMA synchronous=NORMAL")
+        self.__connection.execute("""CREATE TABLE IF NOT EXISTS games (
+                channel_id INTEGER PRIMARY KEY,
+                killed_list_id INTEGER,
+                killed TEXT NOT NULL DEFAULT '',
+                last_message_id INTEGER,
+                board TEXT,
+                remaining INTEGER NOT NULL DEFAULT 0
+            )""")
+        self.__add_columns("games", {"checkpoint": "INTEGER", "killed_pages": "TEXT"})
+        self.__connection.execute("""CREATE TABLE IF NOT EXISTS game_stats (
+                channel_id INTEGER PRIMARY KEY,
+                stats TEXT NOT NULL
+            )""")
+        self.__connection.execute("""CREATE TABLE IF NOT EXISTS game_owners (
+                channel_id INTEGER PRIMARY KEY,
+                owner TEXT NOT NULL,
+                expires REAL NOT NULL
+            )""")
+        self.__connection.commit()
+
+    def __add_columns(self, table: str, columns: Dict[str, str]):
+        """Add columns that are missing from a database created by an older version"""
+        existing = {
+            row[1] for row in self.__connection.execute(f"PRAGMA table_info({table})")
+        }
+        for name, definition in columns.items():
+            if name not in existing:
+                self.__connection.execute(
+                    f"ALTER TABLE {table} ADD COLUMN {name} {definition}"
+                )
+
+    async def load(self, channel_id: int) -> Optional[StoredGame]:
+        """Returns the saved snapshot of a game"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.__executor, self.__load, channel_id)
+
+    def __load(self, channel_id: int) -> Optional[StoredGame]:
+        row = self.__connection.execute(
+            "SELECT channel_id, killed_list_id, killed, last_message_id, board,"
+            " remaining, checkpoint, killed_pages FROM games WHERE channel_id = ?",
+            (channel_id,),
+        ).fetchone()
+        if row is None:
+            return None
+        board = json.loads(row[4]) if row[4] is not None else None
+        # older versions only saved the id of a single page
+        if row[7] is not None:
+            killed_pages = json.loads(row[7])
+        else:
+            killed_pages = [row[1]] if row[1] is not None else []
+        return StoredGame(row[0], killed_pages, row[2], row[3], board, row[5], row[6])
+
+    def save(self, game: Game):
+        """Save a snapshot of the game in the background"""
+        # another process runs the game and saves it now
+        if game.dropped:
+            return
+        current = game.state.current
+        snapshot = StoredGame(
+            game.channel_id,
+            game.killed_list.ids if game.killed_list else [],
+            game.killed_list.render() if game.killed_list else "",
+            current.message_id if current else None,
+            current.outcome.board if current else None,
+            current.outcome.remaining if current else 0,
+            game.checkpoint,
+        )
+        self.__executor.submit(self.__save, snapshot).add_done_callback(self.__report)
+        if game.stats.needs_saving:
+            self.save_stats(game)
+
+    def save_stats(self, game: Game):
+        """Save the player and item statistics of the game in the background"""
+        if game.dropped:
+            return
+        stats = game.stats.dump()
+        self.__executor.submit(
+            self.__save_stats, game.channel_id, stats
+        ).add_done_callback(self.__report)
+
+    def __save_stats(self, channel_id: int, stats: str):
+        self.__connection.execute(
+            "INSERT OR REPLACE INTO game_stats (channel_id, stats) VALUES (?, ?)",
+            (channel_id, stats),
+        )
+        self.__connection.commit()
+
+    async def load_stats(self, channel_id: int) -> Optional[str]:
+        """Returns the saved statistics of a game"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.__executor, self.__load_stats, channel_id
+        )
+
+    def __load_stats(self, channel_id: int) -> Optional[str]:
+        row = self.__connection.execute(
+            "SELECT stats FROM game_stats WHERE channel_id = ?", (channel_id,)
+        ).fetchone()
+        return row[0] if row is not None else None
+
+    async def claim(self, channel_id: int, owner: str, lease: float) -> bool:
+        """Claim or renew the ownership of a game for `lease` seconds
+        Returns False if another process owns the game and its claim hasn't expired
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.__executor, self.__claim, channel_id, owner, lease
+        )
+
+    def __claim(self, channel_id: int, owner: str, lease: float) -> bool:
+        now = time.time()
+        with self.__connection:
+            self.__connection.execute(
+                "INSERT INTO game_owners (channel_id, owner, expires) VALUES (?, ?, ?)"
+                " ON CONFLICT (channel_id) DO UPDATE SET owner = excluded.owner,"
+                " expires = excluded.expires"
+                " WHERE game_owners.owner = excluded.owner OR game_owners.expires < ?",
+                (channel_id, owner, now + lease, now),
+            )
+            row = self.__connection.execute(
+                "SELECT owner FROM game_owners WHERE channel_id = ?", (channel_id,)
+            ).fetchone()
+        return row is not None and row[0] == owner
+
+    def release(self, owner: str):
+        """Give up the ownership of the games of a process in the background"""
+        self.__executor.submit(self.__release, owner).add_done_callback(self.__report)
+
+    def __release(self, owner: str):
+        with self.__connection:
+            self.__connection.execute(
+                "DELETE FROM game_owners WHERE owner = ?", (owner,)
+            )
+
+    @staticmethod
+    def __report(future: Future):
+        """Log a failed write"""
+        error = future.exception()
+        if error is not None:
+            logging.warning(f"Failed to save game state: {error!r}")
+
+    def __save(self, snapshot: StoredGame):
+        board = json.dumps(snapshot.board) if snapshot.board is not None else None
+        self.__connection.execute(
+            "INSERT OR REPLACE INTO games (channel_id, killed_list_id, killed,"
+            " last_message_id, board, remaining, checkpoint, killed_pages)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                snapshot.channel_id,
+                snapshot.killed_pages[0] if snapshot.killed_pages else None,
+                snapshot.killed,
+                snapshot.last_message_id,
+                board,
+                snapshot.remaining,
+                snapshot.checkpoint,
+                json.dumps(snapshot.killed_pages),
+            ),
+        )
+        self.__connection.commit()
+
+    def close(self):
+        """Finish pending writes and close the database"""
+        self.__executor.shutdown(wait=True)
+        self.__connection.close()
@@ -1,151 +1,163 @@
 import re
-from typing import Annotated, Dict, List, Optional, Tuple
+from typing import Annotated, Dict, Iterable, List, Optional, Tuple
 
 import discord
 from cogs.validation.logging import log_death, log_problem
-from discord.ext import commands
-from fuzzywuzzy import process
+from utils.metrics import metrics
+from utils.startup import startup
 
+from .game import Game
+from .game_state import Outcome
+from .game_stats import GameStats
+from .killed_list import KilledList, killed_list_placeholder, parse_entries
+from .outbox import Outbox
+from .parse_cache import ParseCache
+from .parser import ParsedMove
+from .ruleset import Ruleset
+from .store import GameStore
 from .validation_error import ValidationError
 
-# Groups:
-# 1: The name of the choice
-# 2: The current number for the choice
-# 3: '+', '-', or None
-line_regex = re.compile(r"(\w[^\d\n☠️:<]*)\s*[-]\s*(\d{0,3})\b[^+\-\n\d]*([+\-])?")
-
-killed_list_placeholder = "Killed list will appear here"
-
-choices = [
-    "Anchovies",
-    "Baby Corn",
-    "Bacon",
-    "Broccoli",
-    "Cheese (plain)",
-    "Cheese - Paneer",
-    "Hard Cheese (Asiago/Parmesan/Romano)",
-    "Chicken",
-    "Egg",
-    "Eggplant",
-    "Ground Beef",
-    "Ham",
-    "Jalapeno",
-    "Mushrooms",
-    "Olives",
-    "Onion",
-    "Bell Pepper",
-    "Pepperoncini",
-    "Pepperoni",
-    "Pineapple",
-    "Potatoes",
-    "Prosciutto",
-    "Roasted Garlic",
-    "Sausage",
-    "Shrimp",
-    "Spinach",
-    "Tofu",
-    "Tomatoes",
-]
-
-
-async def get_killed_list(chat: discord.TextChannel) -> discord.Message:
+parse_cache = ParseCache()
+
+
+async def get_killed_list(chat: discord.TextChannel) -> KilledList:
     pins: List[discord.Message] = await chat.pins()
-    # start from most recent pin
-    pins.reverse()
-    for message in pins:
-        content: str = message.content
-        if message.author.bot and re.search(r"^\d+\.\) \w+", content):
-            return message
+    # pages of the killed list, oldest first
+    pages = sorted(
+        (
+            message
+            for message in pins
+            if message.author.bot
+            and (
+                re.search(r"^\d+\.\) \w+", message.content)
+                or message.content == killed_list_placeholder
+            )
+        ),
+        key=lambda message: message.id,
+    )
+    if pages:
+        return KilledList(pages)
     # no message found
     message: discord.Message = await chat.send(killed_list_placeholder)
     try:
         await message.pin()
     except Exception:
         pass
-    return message
+    return KilledList([message])
 
 
-def message_matches_pattern(message: discord.Message) -> bool:
-    content: str = message.content
-    return line_regex.search(content) is not None
+async def update_killed_list(game: Game, outbox: Outbox, pages: Iterable[int]):
+    """Edit the pages of the killed list that changed, pinning new pages"""
+    killed_list = game.killed_list
+    for page in pages:
+        if page < len(killed_list.pages):
+            outbox.edit(killed_list.pages[page], killed_list.render(page))
+            continue
+        message: discord.Message = await game.chat.send(killed_list.render(page))
+        try:
+            await message.pin()
+        except Exception:
+            pass
+        killed_list.pages.append(message)
+
+
+async def load_game(game: Game, store: GameStore, user: discord.ClientUser):
+    """Restore the killed list and board of a game from the local store
+    Falls back to searching the pins if the saved snapshot is inconsistent
+    """
+    stored = await store.load(game.channel_id)
+    stats = await store.load_stats(game.channel_id)
+    if stats is not None:
+        game.stats = GameStats.load(stats)
+    if stored is not None:
+        game.checkpoint = stored.checkpoint or stored.last_message_id
+    if stored is not None and stored.killed_pages:
+        pages = []
+        for page_id in stored.killed_pages:
+            try:
+                page = await game.chat.fetch_message(page_id)
+            except discord.NotFound:
+                break
+            if page.author != user or not page.pinned:
+                break
+            pages.append(page)
+        else:
+            game.killed_list = KilledList(pages)
+            # the board is only trusted if the killed list hasn't changed since
+            killed = parse_entries(stored.killed)
+            if game.killed_list.by_placement == killed and stored.board is not None:
+                game.state.restore(
+                    stored.last_message_id, stored.board, stored.remaining
+                )
+            return
+    # get pinned list of killed items
+    game.killed_list = await get_killed_list(game.chat)
+    store.save(game)
+
+
+def message_matches_pattern(move: ParsedMove) -> bool:
+    return move.matched
 
 
 async def get_message_before(
-    before: Optional[discord.Message] = None,
-) -> discord.Message:
+    before: discord.Message, ruleset: Ruleset
+) -> Optional[Tuple[discord.Message, ParsedMove]]:
     """Returns last message before the given message that matches pattern"""
     async for message in before.channel.history(before=before):
-        if message_matches_pattern(message):
-            return message
+        move = parse_cache.get(message, ruleset)
+        if message_matches_pattern(move):
+            return message, move
 
 
-def count_remaining(message: discord.Message) -> int:
+def count_remaining(move: ParsedMove) -> int:
     """Returns the number of ingredients in the list"""
-    return len(message.content.split("\n"))
+    return move.line_count
 
 
-def validate_plus_and_minus(message: discord.Message):
+def validate_plus_and_minus(move: ParsedMove):
     """Throws ValidationError if there are too many or too few pluses/minuses"""
-    content: str = message.content
-    lines = content.split("\n")
-    has_plus = False
-    has_minus = False
-    for line in lines:
-        match = line_regex.search(line)
-        # line doesn't match pattern
-        if not match or match.group(3) is None:
-            continue
-        # group matched plus
-        if match.group(3) == "+":
-            if has_plus:
-                raise ValidationError(f"Two plus signs found.")
-            has_plus = True
-            continue
-        # group matched minus
-        if has_minus:
-            raise ValidationError(f"Two minus signs found.")
-        has_minus = True
-    if not has_plus:
-        if not has_minus:
+    if move.plus_count > 1:
+        raise ValidationError(f"Two plus signs found.")
+    if move.minus_count > 1:
+        raise ValidationError(f"Two minus signs found.")
+    if not move.plus_count:
+        if not move.minus_count:
             raise ValidationError(f"Plus and minus signs are missing.")
         raise ValidationError(f"Plus sign is missing.")
-    if not has_minus:
+    if not move.minus_count:
         raise ValidationError(f"Minus sign is missing.")
 
 
-def get_listed_choices(message: discord.Message) -> Dict[str, Tuple[int, str]]:
-    content: str = message.content
-    lines = content.split("\n")
+def get_listed_choices(move: ParsedMove) -> Dict[str, Tuple[int, str]]:
+    # choices were already resolved for this move
+    if move.listed is not None:
+        return move.listed
     listed: Dict[str, Tuple[int, str]] = {}
-    for line in lines:
-        match = line_regex.search(line)
-        # line doesn't match pattern
-        if not match or not (match.group(2) or match.group(3)):
-            continue
-        choice_input = match.group(1)
-        # find choice in list
-        choice = process.extractOne(choice_input, choices)
-        # check fuzz
-        if not choice or choice[1] < 50:
-            raise ValidationError(f"Didn't recognize the item '{choice_input}'.")
-        # add to dict
-        num = int(match.group(2)) if match.group(2) and match.group(2).isdigit() else 0
-        sign = match.group(3)
-        listed[choice[0]] = (num, sign)
+    with metrics.timer("stage_seconds", stage="resolve"):
+        for choice_input, num, sign in zip(move.items, move.counts, move.signs):
+            # find choice in list
+            choice = move.resolver.resolve(choice_input)
+            if choice is None:
+                raise ValidationError(f"Didn't recognize the item '{choice_input}'.")
+            # add to dict
+            listed[choice] = (num, sign)
+    move.listed = listed
     return listed
 
 
+def get_board(move: ParsedMove) -> Dict[str, int]:
+    """Returns the number for each choice listed in the move"""
+    return {item: num for item, (num, _) in get_listed_choices(move).items()}
+
+
 def validate_choices(
-    previous: discord.Message, message: discord.Message
+    previous: Dict[str, int], new_list: Dict[str, Tuple[int, str]]
 ) -> Optional[str]:
-    """Check that choices are consistent with previous message
+    """Check that choices are consistent with the previous board
     Returns item that was killed if an item was killed this turn
     """
     death = None
-    prev_list = get_listed_choices(previous)
-    new_list = get_listed_choices(message)
-    for item in prev_list.keys():
-        prev_num = prev_list[item][0]
+    for item, prev_num in previous.items():
         # missing item
         if item not in new_list and prev_num > 0:
             raise ValidationError(f"Expected '{item}' but it is missing.")
@@ -166,40 +178,186 @@ def validate_choices(
     return death
 
 
-async def react_with_validation(
+def check_move(previous_board: Dict[str, int], move: ParsedMove) -> Outcome:
+    """Validate a move against the board before it"""
+    try:
+        validate_plus_and_minus(move)
+        new_list = get_listed_choices(move)
+        death_item = validate_choices(previous_board, new_list)
+        board = {item: num for item, (num, _) in new_list.items()}
+        return Outcome(True, None, board, count_remaining(move), death_item)
+    except ValidationError as error:
+        return rejected(move, error)
+
+
+def structured_move(
+    board: Optional[Dict[str, int]], ruleset: Ruleset, plus_name: str, minus_name: str
+) -> Tuple[str, ParsedMove]:
+    """Build a move made with /move from the board in memory
+    Returns the text of the new board and the move, already resolved, so it
+    skips parsing. Raises ValidationError if the move can't be made.
+    """
+    if board is None:
+        raise ValidationError("The board isn't loaded yet, post this move by hand.")
+    plus = ruleset.resolver.resolve(plus_name)
+    minus = ruleset.resolver.resolve(minus_name)
+    for name, item in ((plus_name, plus), (minus_name, minus)):
+        if item is None:
+            raise ValidationError(f"Didn't recognize the item '{name}'.")
+        if board.get(item, 0) <= 0:
+            raise ValidationError(f"{item} is not on the board.")
+    if plus == minus:
+        raise ValidationError("Can't give and take the same item.")
+    listed: Dict[str, Tuple[int, Optional[str]]] = {
+        item: (count, None) for item, count in board.items() if count > 0
+    }
+    listed[plus] = (board[plus] + 1, "+")
+    listed[minus] = (board[minus] - 1, "-")
+    move = ParsedMove(
+        True,
+        tuple(listed),
+        tuple(count for count, _ in listed.values()),
+        tuple(sign for _, sign in listed.values()),
+        len(listed),
+        ruleset.resolver,
+    )
+    move.listed = listed
+    return ruleset.render(listed), move
+
+
+def rejected(move: ParsedMove, error: ValidationError) -> Outcome:
+    """Outcome of an invalid move
+    The next move is still checked against the board listed in this one
+    """
+    try:
+        board = get_board(move)
+    except ValidationError:
+        board = None
+    return Outcome(False, error.message, board, count_remaining(move), None)
+
+
+async def apply_outcome(
     message: discord.Message,
-    bot: commands.Bot,
-    valid: bool,
+    outcome: Outcome,
+    previous: Optional[Outcome],
+    game: Game,
+    outbox: Outbox,
+    notify: bool = True,
 ):
-    emoji_add, emoji_remove = ("✅", "🚫") if valid else ("🚫", "✅")
-    try:
-        await message.remove_reaction(emoji_remove, bot.user)
-    except Exception:
-        pass
-    await message.add_reaction(emoji_add)
+    """React to a move and update the killed list where the outcome changed"""
+    outbox.set_validation(message, outcome.valid)
+    # a move older than the chain was counted when it was first validated,
+    # and its previous outcome is no longer known
+    if game.state.get(message.id) is not None:
+        game.stats.record(message, outcome, previous)
+    # failure
+    if not outcome.valid and (notify or previous is None or previous.valid):
+        log_problem(outbox, message.author, game.chat, outcome.problem)
+    killed_list = game.killed_list
+    # item is no longer killed by this move
+    if previous and previous.death and previous.death != outcome.death:
+        if killed_list.by_item.get(previous.death) == previous.remaining:
+            outbox.unreact(message, "☠️")
+            game.stats.forget_death(previous.death)
+            await update_killed_list(game, outbox, killed_list.remove(previous.death))
+    # item was killed (and it's not already on the list)
+    if (
+        outcome.death
+        and outcome.death not in killed_list
+        and not killed_list.has_placement(outcome.remaining)
+    ):
+        log_death(outbox, game.chat, outcome.death, outcome.remaining)
+        outbox.react(message, "☠️")
+        game.stats.record_death(message, outcome.death, outcome.remaining)
+        page = killed_list.add(outcome.remaining, outcome.death)
+        await update_killed_list(game, outbox, [page])
+
+
+async def board_before(message: discord.Message, game: Game) -> Dict[str, int]:
+    """Returns the board to check a move against
+    Uses the board in memory, and only falls back to history when it is cold.
+    Raises ValidationError if the items of the move before weren't recognized.
+    """
+    previous = game.state.before(message.id)
+    if previous is not None and previous.outcome.board is not None:
+        return previous.outcome.board
+    # the same error as reading the board of that move from history
+    if previous is not None and previous.move is not None:
+        return get_board(previous.move)
+    with metrics.timer("stage_seconds", stage="history"):
+        found = await get_message_before(message, game.ruleset)
+    return get_board(found[1]) if found else {}
+
+
+async def revalidate_after(message_id: int, game: Game, outbox: Outbox):
+    """Re-validate the moves after a changed or deleted move
+    Stops at the first move whose outcome didn't change, since the moves after
+    it can't have changed either
+    """
+    for record in game.state.after(message_id):
+        if record.message is None:
+            break
+        try:
+            previous_board = await board_before(record.message, game)
+        except ValidationError as error:
+            outcome = rejected(record.move, error)
+        else:
+            outcome = check_move(previous_board, record.move)
+        if outcome == record.outcome:
+            break
+        game.state.record(record.message, record.move, outcome)
+        await apply_outcome(
+            record.message, outcome, record.outcome, game, outbox, notify=False
+        )
 
 
 async def validate_message(
     message: discord.Message,
-    chat: discord.TextChannel,
-    killed_list: discord.Message,
-    bot: commands.Bot,
+    move: ParsedMove,
+    game: Game,
+    outbox: Outbox,
+    store: GameStore,
 ):
-    previous_message = await get_message_before(message)
-    # validate message
     try:
-        validate_plus_and_minus(message)
-        death_item = validate_choices(previous_message, message)
-        count = count_remaining(message)
-        # success
-        await react_with_validation(message, bot, True)
-        # item was killed (and it's not already on the list)
-        killed_str = killed_list.content.replace(killed_list_placeholder, "")
-        if death_item and not killed_str.startswith(f"{count}.)"):
-            await log_death(chat, death_item, count)
-            await message.add_reaction("☠️")
-            await killed_list.edit(content=f"{count}.) {death_item}\n{killed_str}")
+        previous_board = await board_before(message, game)
     except ValidationError as error:
-        # failure
-        await react_with_validation(message, bot, False)
-        await log_problem(message.author, chat, error.message)
+        outcome = rejected(move, error)
+    else:
+        with metrics.timer("stage_seconds", stage="check"):
+            outcome = check_move(previous_board, move)
+    metrics.inc("validations_total", outcome="valid" if outcome.valid else "invalid")
+    previous = game.state.record(message, move, outcome)
+    with metrics.timer("stage_seconds", stage="apply"):
+        await apply_outcome(
+            message, outcome, previous.outcome if previous else None, game, outbox
+        )
+    # an edited move, or a move validated after moves posted later (like a
+    # /move whose board is posted once it is validated), may change the
+    # outcome of the moves after it
+    current = game.state.current
+    if previous is not None or (
+        current is not None
+        and current.message_id > message.id
+        and game.state.get(message.id) is not None
+    ):
+        with metrics.timer("stage_seconds", stage="cascade"):
+            await revalidate_after(message.id, game, outbox)
+    # save the board, killed list and checkpoint for restarts
+    game.advance(message.id)
+    store.save(game)
+    startup.mark("first validated message")
+
+
+async def remove_move(message_id: int, game: Game, outbox: Outbox, store: GameStore):
+    """Forget a deleted move and re-validate the moves after it"""
+    record = game.state.remove(message_id)
+    if record is None:
+        return
+    game.stats.forget(record.message, record.outcome)
+    # the deleted move no longer kills its item
+    death = record.outcome.death
+    if death and game.killed_list.by_item.get(death) == record.outcome.remaining:
+        game.stats.forget_death(death)
+        await update_killed_list(game, outbox, game.killed_list.remove(death))
+    await revalidate_after(message_id, game, outbox)
+    store.save(game)
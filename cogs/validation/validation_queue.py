@@ -0,0 +1,88 @@
+import asyncio
+import time
+from typing import Awaitable, Callable, Dict, Optional
+
+import discord
+from discord.ext import commands
+from utils.metrics import metrics
+
+
+class ValidationQueue:
+    """Validates the moves of a channel one at a time, in the order received
+
+    The queue is bounded, so when it is full the listeners wait for room
+    instead of starting more validations. The worker stops while the channel
+    is idle and is started again by the next job.
+    """
+
+    def __init__(
+        self, bot: commands.Bot, maxsize: int = 100, idle_timeout: float = 300.0
+    ):
+        self.__bot = bot
+        self.__maxsize = maxsize
+        self.__idle_timeout = idle_timeout
+        self.__queue: Optional[asyncio.Queue] = None
+        self.__worker: Optional[asyncio.Task] = None
+        self.processed = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.last_wait = 0.0
+
+    async def put(
+        self,
+        event: str,
+        message: discord.Message,
+        job: Callable[[], Awaitable[None]],
+    ):
+        """Add a validation job, waiting if the queue is full"""
+        if self.__queue is None:
+            self.__queue = asyncio.Queue(self.__maxsize)
+        if self.__worker is None or self.__worker.done():
+            self.__worker = asyncio.create_task(self.__work())
+        await self.__queue.put((time.perf_counter(), event, message, job))
+
+    async def __work(self):
+        """Run the queued jobs one after another"""
+        while True:
+            try:
+                item = await asyncio.wait_for(self.__queue.get(), self.__idle_timeout)
+            except asyncio.TimeoutError:
+                if self.__queue.empty():
+                    return
+                continue
+            queued_at, event, message, job = item
+            wait = time.perf_counter() - queued_at
+            self.processed += 1
+            self.total_wait += wait
+            self.last_wait = wait
+            self.max_wait = max(self.max_wait, wait)
+            metrics.observe("queue_wait_seconds", wait)
+            try:
+                with metrics.timer("stage_seconds", stage="job"):
+                    await job()
+            except Exception:
+                # report the error the same way as an error in the listener
+                await self.__bot.on_error(event, message)
+            finally:
+                self.__queue.task_done()
+
+    @property
+    def depth(self) -> int:
+        """Number of jobs waiting to run"""
+        return self.__queue.qsize() if self.__queue is not None else 0
+
+    def stats(self) -> Dict[str, str]:
+        """Returns the queue depth and wait times"""
+        mean_wait = self.total_wait / self.processed if self.processed else 0.0
+        return {
+            "depth": f"{self.depth}/{self.__maxsize}",
+            "processed": str(self.processed),
+            "last wait": f"{self.last_wait * 1000:.1f} ms",
+            "mean wait": f"{mean_wait * 1000:.1f} ms",
+            "max wait": f"{self.max_wait * 1000:.1f} ms",
+        }
+
+    def close(self):
+        """Stop the worker"""
+        if self.__worker is not None:
+            self.__worker.cancel()
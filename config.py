@@ -7,8 +7,85 @@ load_dotenv()
 DISCORD_TOKEN = os.getenv("DISCORD_TOKEN", "")
 BOT_PREFIX = ">"
 
-GUILD_ID = int(os.getenv("GUILD", ""))
+GUILD_ID = int(os.getenv("GUILD", "0"))
 
-GIVE_AND_TAKE_CHANNEL = int(os.getenv("GIVE_AND_TAKE_CHANNEL", ""))
+GIVE_AND_TAKE_CHANNEL = int(os.getenv("GIVE_AND_TAKE_CHANNEL", "0"))
 
-GIVE_AND_TAKE_CHAT_CHANNEL = int(os.getenv("GIVE_AND_TAKE_CHAT_CHANNEL", ""))
+GIVE_AND_TAKE_CHAT_CHANNEL = int(os.getenv("GIVE_AND_TAKE_CHAT_CHANNEL", "0"))
+
+# games to validate as comma-separated "channel_id:chat_channel_id" pairs
+# (defaults to the single game configured above)
+GIVE_AND_TAKE_GAMES = [
+    (int(channel_id), int(chat_id))
+    for channel_id, chat_id in (
+        pair.split(":")
+        for pair in os.getenv(
+            "GIVE_AND_TAKE_GAMES",
+            f"{GIVE_AND_TAKE_CHANNEL}:{GIVE_AND_TAKE_CHAT_CHANNEL}",
+        ).split(",")
+        if pair.strip()
+    )
+    if int(channel_id) and int(chat_id)
+]
+
+# maximum number of moves waiting to be validated in a channel
+VALIDATION_QUEUE_SIZE = int(os.getenv("VALIDATION_QUEUE_SIZE", "100"))
+
+# local database for restoring game state after restarts
+STATE_DB = os.getenv("STATE_DB", "game_state.db")
+
+# seconds to wait for an edited move to stop changing before validating it
+EDIT_DEBOUNCE_SECONDS = float(os.getenv("EDIT_DEBOUNCE_SECONDS", "2"))
+
+# error log file, rotated when it reaches the maximum size
+ERROR_LOG = os.getenv("ERROR_LOG", "err.log")
+ERROR_LOG_MAX_BYTES = int(os.getenv("ERROR_LOG_MAX_BYTES", str(1024 * 1024)))
+ERROR_LOG_BACKUPS = int(os.getenv("ERROR_LOG_BACKUPS", "3"))
+
+# collect per-stage timings and counters of the validation pipeline
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+# export metrics in the Prometheus text format to a file and/or localhost port
+METRICS_FILE = os.getenv("METRICS_FILE", "")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+METRICS_INTERVAL = float(os.getenv("METRICS_INTERVAL", "15"))
+
+# directory of the ruleset files (<channel id>.json, or default.json),
+# by default the one next to this file whatever the working directory
+RULESETS_DIR = os.getenv(
+    "RULESETS_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "rulesets")
+)
+
+# hash of the slash commands last synced with Discord
+SLASH_MANIFEST = os.getenv("SLASH_MANIFEST", ".slash_manifest")
+
+# minimal intents and no member cache, for large guilds
+LEAN_MODE = os.getenv("LEAN_MODE", "false").lower() == "true"
+# messages kept in discord.py's message cache (0 to disable it)
+MAX_MESSAGES = int(os.getenv("MAX_MESSAGES", "0" if LEAN_MODE else "1000")) or None
+
+# seconds during which repeats of an error are counted instead of logged
+ERROR_WINDOW = float(os.getenv("ERROR_WINDOW", "60"))
+# error messages sent to users per channel every ERROR_NOTICE_PERIOD seconds
+ERROR_NOTICES_PER_CHANNEL = int(os.getenv("ERROR_NOTICES_PER_CHANNEL", "3"))
+ERROR_NOTICE_PERIOD = float(os.getenv("ERROR_NOTICE_PERIOD", "60"))
+
+# total number of shards ("auto" to use the number Discord recommends),
+# or empty to run the bot without sharding
+SHARD_COUNT = os.getenv("SHARD_COUNT", "").strip().lower()
+# shards run by this process as ranges like "0-3,6" (all shards if empty)
+SHARD_IDS = [
+    shard_id
+    for part in os.getenv("SHARD_IDS", "").split(",")
+    if part.strip()
+    for shard_id in range(int(part.split("-")[0]), int(part.split("-")[-1]) + 1)
+]
+# discord.py needs the total number of shards to run only some of them
+if SHARD_IDS and SHARD_COUNT in ("", "auto"):
+    raise ValueError("SHARD_IDS needs SHARD_COUNT to be a number of shards.")
+# name under which this process claims its games in the shared STATE_DB,
+# the same across restarts so a restarted process takes its games back
+GAME_OWNER = os.getenv("GAME_OWNER", "") or (
+    f"shards {os.getenv('SHARD_IDS')}" if SHARD_IDS else "main"
+)
+# seconds a claim on a game lasts unless the owning process renews it
+GAME_LEASE_SECONDS = float(os.getenv("GAME_LEASE_SECONDS", "60"))
@@ -0,0 +1 @@
+"""Load tests of the bot against a local stand-in for Discord"""
@@ -0,0 +1,679 @@
+"""Local stand-in for Discord's gateway and HTTP API
+
+Serves just enough of API v7 for the bot and its cogs to run unmodified:
+logging in, the gateway (hello, identify, heartbeats, member chunks and
+dispatches), messages, edits, history, pins, reactions and slash commands.
+Responses carry rate limit headers, routes return 429 once their bucket is
+empty, and every response can be delayed to simulate latency.
+"""
+
+import asyncio
+import itertools
+import json
+import random
+import time
+import zlib
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+import discord
+from aiohttp import WSMsgType, web
+
+api_prefix = "/api/v7"
+
+# calls allowed per number of seconds for each bucket (per channel), as
+# documented by Discord for these routes
+bucket_limits = {
+    "reaction": (1, 0.25),
+    "send": (5, 5.0),
+    "edit": (5, 5.0),
+    "pin": (5, 5.0),
+    "read": (50, 1.0),
+}
+
+# opcodes of the gateway
+DISPATCH = 0
+HEARTBEAT = 1
+IDENTIFY = 2
+REQUEST_MEMBERS = 8
+HELLO = 10
+HEARTBEAT_ACK = 11
+
+Handler = Callable[[web.Request], Awaitable[web.StreamResponse]]
+
+
+def timestamp() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def gateway_payload(
+    op: int, data: Optional[Dict] = None, event: Optional[str] = None, sequence=None
+) -> Dict:
+    """A gateway payload, with every field set like Discord does"""
+    return {"op": op, "d": data, "t": event, "s": sequence}
+
+
+def json_response(data, status: int = 200, headers: Optional[Dict] = None):
+    """JSON response with the exact content type discord.py looks for"""
+    return web.Response(
+        body=json.dumps(data).encode("utf-8"),
+        status=status,
+        headers={"Content-Type": "application/json", **(headers or {})},
+    )
+
+
+def user_data(user_id: int, name: str, bot: bool = False) -> Dict:
+    return {
+        "id": str(user_id),
+        "username": name,
+        "discriminator": "0001",
+        "avatar": None,
+        "bot": bot,
+    }
+
+
+def member_data(user: Dict) -> Dict:
+    return {
+        "user": user,
+        "roles": [],
+        "joined_at": timestamp(),
+        "deaf": False,
+        "mute": False,
+        "nick": None,
+    }
+
+
+class FakeMessage:
+    """A message stored by the fake API"""
+
+    __slots__ = (
+        "id",
+        "channel_id",
+        "author",
+        "content",
+        "embeds",
+        "edited",
+        "pinned",
+        "reactions",
+    )
+
+    def __init__(self, message_id: int, channel_id: int, author: Dict, content: str):
+        self.id = message_id
+        self.channel_id = channel_id
+        self.author = author
+        self.content = content
+        self.embeds: List[Dict] = []
+        self.edited: Optional[str] = None
+        self.pinned = False
+        # reactions placed by the bot
+        self.reactions: Set[str] = set()
+
+
+class Bucket:
+    """Fixed window of `limit` calls, reset `per` seconds after it started"""
+
+    __slots__ = ("limit", "per", "remaining", "reset_at")
+
+    def __init__(self, limit: int, per: float):
+        self.limit = limit
+        self.per = per
+        self.remaining = limit
+        self.reset_at = 0.0
+
+    def take(self) -> Tuple[bool, float]:
+        """Use a call, returning whether it is allowed and the seconds until
+        the window resets"""
+        now = time.monotonic()
+        if now >= self.reset_at:
+            self.remaining = self.limit
+            self.reset_at = now + self.per
+        if self.remaining == 0:
+            return False, self.reset_at - now
+        self.remaining -= 1
+        return True, self.reset_at - now
+
+
+class FakeDiscord:
+    """Gateway and HTTP API of a single guild with a number of text channels"""
+
+    def __init__(
+        self,
+        channels: int,
+        players: int = 20,
+        latency: float = 0.05,
+        jitter: float = 0.02,
+        spurious_429: float = 0.0,
+        seed: int = 0,
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.spurious_429 = spurious_429
+        self.__rng = random.Random(seed)
+        self.__last_id = 0
+        self.guild_id = self.snowflake()
+        self.bot_user = user_data(self.snowflake(), "give-and-take", bot=True)
+        self.players = [
+            user_data(self.snowflake(), f"player{i}") for i in range(players)
+        ]
+        self.channel_ids = [self.snowflake() for _ in range(channels)]
+        self.messages: Dict[int, FakeMessage] = {}
+        self.by_channel: Dict[int, List[int]] = {c: [] for c in self.channel_ids}
+        self.__buckets: Dict[Tuple[str, int], Bucket] = {}
+        # outgoing payloads of the gateway session of the guild's shard
+        self.__sessions: Set[asyncio.Queue] = set()
+        self.__sequence = itertools.count(1)
+        self.__runner: Optional[web.AppRunner] = None
+        self.port = 0
+        # what the bot did, for the report
+        self.calls: Counter = Counter()
+        self.statuses: Counter = Counter()
+        self.reacted_at: Dict[int, float] = {}
+        self.pinned: Set[int] = set()
+        # channel and response message of each slash command, by token
+        self.interactions: Dict[str, Tuple[int, Optional[int]]] = {}
+        # slash commands answered only to the player
+        self.hidden_replies: Set[str] = set()
+
+    def snowflake(self) -> int:
+        """Returns an id that increases, dated now"""
+        self.__last_id = max(
+            self.__last_id + 1, discord.utils.time_snowflake(datetime.utcnow())
+        )
+        return self.__last_id
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}{api_prefix}"
+
+    async def start(self, port: int = 0):
+        app = web.Application()
+        app.router.add_get("/gateway", self.gateway)
+        routes = [
+            ("GET", "/users/@me", self.get_me, None),
+            ("GET", "/gateway", self.get_gateway, None),
+            ("GET", "/gateway/bot", self.get_bot_gateway, None),
+            ("GET", "/channels/{channel_id}/messages", self.history, "read"),
+            ("POST", "/channels/{channel_id}/messages", self.send, "send"),
+            (
+                "GET",
+                "/channels/{channel_id}/messages/{message_id}",
+                self.fetch,
+                "read",
+            ),
+            (
+                "PATCH",
+                "/channels/{channel_id}/messages/{message_id}",
+                self.edit,
+                "edit",
+            ),
+            ("GET", "/channels/{channel_id}/pins", self.pins, "read"),
+            ("PUT", "/channels/{channel_id}/pins/{message_id}", self.pin, "pin"),
+            (
+                "PUT",
+                "/channels/{channel_id}/messages/{message_id}/reactions/{emoji}/@me",
+                self.react,
+                "reaction",
+            ),
+            (
+                "DELETE",
+                "/channels/{channel_id}/messages/{message_id}/reactions/{emoji}/{user}",
+                self.unreact,
+                "reaction",
+            ),
+            (
+                "POST",
+                "/interactions/{interaction_id}/{token}/callback",
+                self.respond,
+                None,
+            ),
+            (
+                "PATCH",
+                "/webhooks/{app_id}/{token}/messages/{message_id}",
+                self.edit_response,
+                None,
+            ),
+            # slash commands, accepted as they are
+            ("GET", "/applications/{app_id}/commands", self.no_commands, None),
+            ("PUT", "/applications/{app_id}/commands", self.put_commands, None),
+            (
+                "GET",
+                "/applications/{app_id}/guilds/{guild_id}/commands",
+                self.no_commands,
+                None,
+            ),
+            (
+                "PUT",
+                "/applications/{app_id}/guilds/{guild_id}/commands",
+                self.put_commands,
+                None,
+            ),
+        ]
+        for method, path, handler, bucket in routes:
+            app.router.add_route(
+                method, api_prefix + path, self.__limited(handler, bucket)
+            )
+        self.__runner = web.AppRunner(app)
+        await self.__runner.setup()
+        site = web.TCPSite(self.__runner, "127.0.0.1", port)
+        await site.start()
+        self.port = self.__runner.addresses[0][1]
+
+    async def close(self):
+        for queue in self.__sessions:
+            queue.put_nowait(None)
+        if self.__runner is not None:
+            await self.__runner.cleanup()
+
+    def __limited(self, handler: Handler, bucket: Optional[str] = None) -> Handler:
+        """Count, delay and rate limit the calls of a route"""
+
+        async def limited(request: web.Request) -> web.StreamResponse:
+            self.calls[handler.__name__] += 1
+            if self.latency or self.jitter:
+                await asyncio.sleep(self.latency + self.__rng.random() * self.jitter)
+            headers = {}
+            if bucket is not None:
+                channel_id = int(request.match_info["channel_id"])
+                key = (bucket, channel_id)
+                if key not in self.__buckets:
+                    self.__buckets[key] = Bucket(*bucket_limits[bucket])
+                limit = self.__buckets[key]
+                allowed, reset_after = limit.take()
+                if not allowed or self.__rng.random() < self.spurious_429:
+                    self.statuses[429] += 1
+                    return json_response(
+                        {
+                            "message": "You are being rate limited.",
+                            # in milliseconds in this version of the API
+                            "retry_after": max(reset_after, 0.05) * 1000,
+                            "global": False,
+                        },
+                        status=429,
+                        headers={"Via": "1.1 google"},
+                    )
+                headers = {
+                    "X-RateLimit-Limit": str(limit.limit),
+                    "X-RateLimit-Remaining": str(limit.remaining),
+                    "X-RateLimit-Reset-After": f"{reset_after:.3f}",
+                    "X-RateLimit-Bucket": bucket,
+                }
+            response = await handler(request)
+            response.headers.update(headers)
+            self.statuses[response.status] += 1
+            return response
+
+        limited.__name__ = handler.__name__
+        return limited
+
+    def __message(self, request: web.Request) -> Optional[FakeMessage]:
+        message = self.messages.get(int(request.match_info["message_id"]))
+        if message is None or message.channel_id != int(
+            request.match_info["channel_id"]
+        ):
+            return None
+        return message
+
+    def message_data(self, message: FakeMessage) -> Dict:
+        data = {
+            "id": str(message.id),
+            "channel_id": str(message.channel_id),
+            "guild_id": str(self.guild_id),
+            "author": message.author,
+            "content": message.content,
+            "timestamp": discord.utils.snowflake_time(message.id)
+            .replace(tzinfo=timezone.utc)
+            .isoformat(),
+            "edited_timestamp": message.edited,
+            "tts": False,
+            "mention_everyone": False,
+            "mentions": [],
+            "mention_roles": [],
+            "attachments": [],
+            "components": [],
+            "embeds": message.embeds,
+            "reactions": [
+                {"emoji": {"id": None, "name": emoji}, "count": 1, "me": True}
+                for emoji in message.reactions
+            ],
+            "pinned": message.pinned,
+            "type": 0,
+        }
+        if not message.author.get("bot"):
+            data["member"] = member_data(message.author)
+        return data
+
+    # HTTP API
+
+    async def get_me(self, _: web.Request) -> web.Response:
+        return json_response(self.bot_user)
+
+    async def get_gateway(self, _: web.Request) -> web.Response:
+        return json_response({"url": f"ws://127.0.0.1:{self.port}/gateway"})
+
+    async def get_bot_gateway(self, _: web.Request) -> web.Response:
+        return json_response(
+            {
+                "url": f"ws://127.0.0.1:{self.port}/gateway",
+                "shards": 1,
+                "session_start_limit": {
+                    "total": 1000,
+                    "remaining": 1000,
+                    "reset_after": 0,
+                    "max_concurrency": 1,
+                },
+            }
+        )
+
+    async def history(self, request: web.Request) -> web.Response:
+        ids = self.by_channel.get(int(request.match_info["channel_id"]), [])
+        limit = int(request.query.get("limit", 50))
+        if "after" in request.query:
+            after = int(request.query["after"])
+            found = [i for i in ids if i > after][:limit]
+        else:
+            before = int(request.query.get("before", 1 << 63))
+            found = [i for i in ids if i < before][-limit:]
+        # newest first, like Discord
+        return json_response(
+            [self.message_data(self.messages[i]) for i in reversed(found)]
+        )
+
+    async def send(self, request: web.Request) -> web.Response:
+        payload = await request.json()
+        message = self.post(
+            int(request.match_info["channel_id"]),
+            self.bot_user,
+            payload.get("content") or "",
+        )
+        if payload.get("embed"):
+            message.embeds = [payload["embed"]]
+        return json_response(self.message_data(message))
+
+    async def fetch(self, request: web.Request) -> web.Response:
+        message = self.__message(request)
+        if message is None:
+            return self.not_found()
+        return json_response(self.message_data(message))
+
+    async def edit(self, request: web.Request) -> web.Response:
+        message = self.__message(request)
+        if message is None:
+            return self.not_found()
+        payload = await request.json()
+        if "content" in payload:
+            message.content = payload["content"] or ""
+        if "embed" in payload:
+            message.embeds = [payload["embed"]] if payload["embed"] else []
+        message.edited = timestamp()
+        data = self.message_data(message)
+        self.dispatch("MESSAGE_UPDATE", data)
+        return json_response(data)
+
+    async def pins(self, request: web.Request) -> web.Response:
+        channel_id = int(request.match_info["channel_id"])
+        return json_response(
+            [
+                self.message_data(self.messages[i])
+                for i in reversed(self.by_channel.get(channel_id, []))
+                if self.messages[i].pinned
+            ]
+        )
+
+    async def pin(self, request: web.Request) -> web.Response:
+        message = self.__message(request)
+        if message is None:
+            return self.not_found()
+        message.pinned = True
+        self.pinned.add(message.id)
+        return web.Response(status=204)
+
+    async def react(self, request: web.Request) -> web.Response:
+        message = self.__message(request)
+        if message is None:
+            return self.not_found()
+        emoji = request.match_info["emoji"]
+        message.reactions.add(emoji)
+        self.reacted_at.setdefault(message.id, time.perf_counter())
+        self.dispatch(
+            "MESSAGE_REACTION_ADD",
+            {
+                "user_id": self.bot_user["id"],
+                "channel_id": str(message.channel_id),
+                "message_id": str(message.id),
+                "guild_id": str(self.guild_id),
+                "emoji": {"id": None, "name": emoji},
+                "member": member_data(self.bot_user),
+            },
+        )
+        return web.Response(status=204)
+
+    async def unreact(self, request: web.Request) -> web.Response:
+        message = self.__message(request)
+        if message is None:
+            return self.not_found()
+        emoji = request.match_info["emoji"]
+        message.reactions.discard(emoji)
+        self.dispatch(
+            "MESSAGE_REACTION_REMOVE",
+            {
+                "user_id": self.bot_user["id"],
+                "channel_id": str(message.channel_id),
+                "message_id": str(message.id),
+                "guild_id": str(self.guild_id),
+                "emoji": {"id": None, "name": emoji},
+            },
+        )
+        return web.Response(status=204)
+
+    async def respond(self, request: web.Request) -> web.Response:
+        """Initial response to a slash command"""
+        token = request.match_info["token"]
+        payload = await request.json()
+        data = payload.get("data") or {}
+        if data.get("flags", 0) & 64:
+            # only shown to the player
+            self.hidden_replies.add(token)
+        elif payload["type"] in (4, 5):
+            # a deferred response is posted right away, empty until it is edited
+            channel_id, _ = self.interactions[token]
+            message = self.post(channel_id, self.bot_user, data.get("content") or "")
+            self.interactions[token] = (channel_id, message.id)
+        return web.Response(status=204)
+
+    async def edit_response(self, request: web.Request) -> web.Response:
+        """Edit the response to a slash command, or send it after deferring"""
+        token = request.match_info["token"]
+        channel_id, message_id = self.interactions[token]
+        payload = await request.json()
+        if message_id is None:
+            message = self.post(channel_id, self.bot_user, payload.get("content") or "")
+            self.interactions[token] = (channel_id, message.id)
+        else:
+            message = self.messages[message_id]
+            if payload.get("content") is not None:
+                self.update(message, payload["content"])
+        return json_response(self.message_data(message))
+
+    async def no_commands(self, _: web.Request) -> web.Response:
+        return json_response([])
+
+    async def put_commands(self, request: web.Request) -> web.Response:
+        commands = await request.json()
+        for command in commands:
+            command["id"] = str(self.snowflake())
+        return json_response(commands)
+
+    @staticmethod
+    def not_found() -> web.Response:
+        return json_response({"message": "Unknown Message", "code": 10008}, status=404)
+
+    # players
+
+    def post(self, channel_id: int, author: Dict, content: str) -> FakeMessage:
+        """Store a message and dispatch it to the bot"""
+        message = FakeMessage(self.snowflake(), channel_id, author, content)
+        self.messages[message.id] = message
+        self.by_channel.setdefault(channel_id, []).append(message.id)
+        self.dispatch("MESSAGE_CREATE", self.message_data(message))
+        return message
+
+    def interact(
+        self, channel_id: int, author: Dict, name: str, options: Dict[str, str]
+    ) -> str:
+        """Run a slash command as a player, returning its token"""
+        token = f"token{self.snowflake()}"
+        self.interactions[token] = (channel_id, None)
+        member = member_data(author)
+        member["permissions"] = "0"
+        self.dispatch(
+            "INTERACTION_CREATE",
+            {
+                "id": str(self.snowflake()),
+                "application_id": self.bot_user["id"],
+                "type": 2,
+                "token": token,
+                "version": 1,
+                "guild_id": str(self.guild_id),
+                "channel_id": str(channel_id),
+                "member": member,
+                "data": {
+                    "id": str(self.snowflake()),
+                    "name": name,
+                    "options": [
+                        {"name": key, "type": 3, "value": value}
+                        for key, value in options.items()
+                    ],
+                },
+            },
+        )
+        return token
+
+    def response_id(self, token: str) -> Optional[int]:
+        """Id of the message the bot responded to a slash command with"""
+        return self.interactions.get(token, (0, None))[1]
+
+    def update(self, message: FakeMessage, content: str):
+        """Edit a message and dispatch the edit to the bot"""
+        message.content = content
+        message.edited = timestamp()
+        self.dispatch("MESSAGE_UPDATE", self.message_data(message))
+
+    # gateway
+
+    def guild_data(self) -> Dict:
+        channels = [
+            {
+                "id": str(channel_id),
+                "type": 0,
+                "name": f"channel-{position}",
+                "position": position,
+                "guild_id": str(self.guild_id),
+                "permission_overwrites": [],
+                "nsfw": False,
+                "parent_id": None,
+                "topic": None,
+                "rate_limit_per_user": 0,
+            }
+            for position, channel_id in enumerate(self.channel_ids)
+        ]
+        everyone = {
+            "id": str(self.guild_id),
+            "name": "@everyone",
+            "permissions": str(discord.Permissions.all().value),
+            "position": 0,
+            "color": 0,
+            "hoist": False,
+            "managed": False,
+            "mentionable": False,
+        }
+        return {
+            "id": str(self.guild_id),
+            "name": "load test",
+            "owner_id": self.players[0]["id"] if self.players else None,
+            "region": "local",
+            "unavailable": False,
+            "member_count": len(self.players) + 1,
+            "large": False,
+            "channels": channels,
+            "roles": [everyone],
+            "members": [member_data(self.bot_user)],
+            "emojis": [],
+            "features": [],
+            "voice_states": [],
+            "presences": [],
+        }
+
+    def dispatch(self, event: str, data: Dict, queue: Optional[asyncio.Queue] = None):
+        """Send an event to one gateway session, or to the shard of the guild"""
+        dispatched = gateway_payload(DISPATCH, data, event, next(self.__sequence))
+        for session in [queue] if queue is not None else self.__sessions:
+            session.put_nowait(dispatched)
+
+    async def gateway(self, request: web.Request) -> web.WebSocketResponse:
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        queue: asyncio.Queue = asyncio.Queue()
+        writer = asyncio.create_task(
+            self.__write(ws, queue, request.query.get("compress") == "zlib-stream")
+        )
+        queue.put_nowait(gateway_payload(HELLO, {"heartbeat_interval": 41250}))
+        try:
+            async for frame in ws:
+                if frame.type != WSMsgType.TEXT:
+                    continue
+                payload = json.loads(frame.data)
+                op = payload.get("op")
+                if op == HEARTBEAT:
+                    queue.put_nowait(gateway_payload(HEARTBEAT_ACK))
+                elif op == IDENTIFY:
+                    # guilds are sent to shard (guild_id >> 22) % shard count
+                    shard_id, shard_count = payload["d"].get("shard") or (0, 1)
+                    in_shard = (self.guild_id >> 22) % shard_count == shard_id
+                    guilds = [{"id": str(self.guild_id), "unavailable": True}]
+                    self.dispatch(
+                        "READY",
+                        {
+                            "v": 7,
+                            "user": self.bot_user,
+                            "guilds": guilds if in_shard else [],
+                            "session_id": f"loadtest-{shard_id}",
+                            "application": {"id": self.bot_user["id"], "flags": 0},
+                        },
+                        queue,
+                    )
+                    if in_shard:
+                        self.__sessions.add(queue)
+                        self.dispatch("GUILD_CREATE", self.guild_data())
+                elif op == REQUEST_MEMBERS:
+                    members = [self.bot_user, *self.players]
+                    self.dispatch(
+                        "GUILD_MEMBERS_CHUNK",
+                        {
+                            "guild_id": str(self.guild_id),
+                            "members": [member_data(user) for user in members],
+                            "chunk_index": 0,
+                            "chunk_count": 1,
+                            "nonce": payload["d"].get("nonce"),
+                        },
+                    )
+        finally:
+            self.__sessions.discard(queue)
+            writer.cancel()
+        return ws
+
+    @staticmethod
+    async def __write(ws: web.WebSocketResponse, queue: asyncio.Queue, compress: bool):
+        """Send the payloads of a session in order, as a zlib stream if asked"""
+        compressor = zlib.compressobj()
+        while True:
+            payload = await queue.get()
+            if payload is None:
+                await ws.close()
+                return
+            text = json.dumps(payload, separators=(",", ":"))
+            if compress:
+                data = compressor.compress(text.encode("utf-8"))
+                await ws.send_bytes(data + compressor.flush(zlib.Z_SYNC_FLUSH))
+            else:
+                await ws.send_str(text)
@@ -0,0 +1,344 @@
+"""End-to-end load test of the bot against a local fake Discord
+
+Usage: python -m loadtest.run [--games N] [--moves N] [--burst N]
+    [--interval SECONDS] [--latency MS] [--jitter MS] [--spurious-429 P]
+    [--slash-rate P] [--lean] [--shards N] [--output FILE]
+
+Starts a stand-in gateway and HTTP API, runs the real bot and cogs against
+it, and replays synthetic games as bursts of concurrent moves, edits and
+chat. Prints the time from a move being posted to the bot's reaction, the
+API calls made per move and the error rate as JSON.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import types
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+import discord
+import discord_slash.http
+
+import config
+from bot import create_bot
+from benchmarks.transcripts import Event, generate
+from cogs.error_log.error_handler import error_aggregator
+
+from .fake_discord import FakeDiscord, FakeMessage
+
+# seconds without any API call after which the bot is considered idle
+quiet_period = 1.5
+
+
+def configure(games: List[Tuple[int, int]], directory: str, lean: bool, shards: int):
+    """Point the cogs at the fake games, and keep their files out of the tree"""
+    config.GIVE_AND_TAKE_GAMES = games
+    # the fake's guild is the only one, whatever GUILD is set to
+    config.GUILD_ID = 0
+    config.STATE_DB = os.path.join(directory, "game_state.db")
+    config.ERROR_LOG = os.path.join(directory, "err.log")
+    config.SLASH_MANIFEST = os.path.join(directory, ".slash_manifest")
+    config.METRICS_FILE = ""
+    config.METRICS_PORT = 0
+    config.LEAN_MODE = lean
+    config.MAX_MESSAGES = None if lean else 1000
+    # every shard runs in this process
+    config.SHARD_COUNT = str(shards) if shards else ""
+    config.SHARD_IDS = []
+
+
+def error_count() -> int:
+    """Errors reported to the bot's error handler so far"""
+    return sum(
+        entry.count for entry in error_aggregator.top(error_aggregator.max_entries)
+    )
+
+
+def percentile(ordered: Sequence[float], fraction: float) -> float:
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+async def replay(
+    fake: FakeDiscord,
+    channel_id: int,
+    events: List[Event],
+    burst: int,
+    interval: float,
+    slash_rate: float,
+    seed: int,
+) -> Dict[Union[int, str], float]:
+    """Post the events of a game in bursts, returning when each move was posted,
+    by message id, or by token for moves made with /move"""
+    rng = random.Random(seed)
+    messages: List[Optional[FakeMessage]] = []
+    posted: Dict[Union[int, str], float] = {}
+    for start in range(0, len(events), burst):
+        for event in events[start : start + burst]:
+            player = rng.choice(fake.players)
+            message = None
+            if event.edit_of is not None:
+                message = messages[event.edit_of]
+                # moves made with /move are posted by the bot and not edited
+                if message is not None:
+                    fake.update(message, event.content)
+            elif event.plus is not None and rng.random() < slash_rate:
+                options = {"plus": event.plus, "minus": event.minus}
+                token = fake.interact(channel_id, player, "move", options)
+                posted[token] = time.perf_counter()
+                # players see the board of a /move once the bot posts it
+                await wait_for_response(fake, token)
+            else:
+                message = fake.post(channel_id, player, event.content)
+                if event.is_move:
+                    posted[message.id] = time.perf_counter()
+            # keep the indexes of the transcript
+            messages.append(message)
+        await asyncio.sleep(interval)
+    return posted
+
+
+async def wait_for_response(fake: FakeDiscord, token: str, timeout: float = 10.0):
+    """Wait until the bot posted the board of a /move, or rejected it"""
+    deadline = time.perf_counter() + timeout
+    while response(fake, token) is None and token not in fake.hidden_replies:
+        if time.perf_counter() > deadline:
+            return
+        await asyncio.sleep(0.01)
+
+
+def response(fake: FakeDiscord, token: str) -> Optional[str]:
+    """What the bot answered to a /move in the channel, once it isn't deferred"""
+    message_id = fake.response_id(token)
+    content = fake.messages[message_id].content if message_id is not None else ""
+    return content or None
+
+
+def made_board(fake: FakeDiscord, token: str) -> bool:
+    """Whether the bot answered a /move with a board rather than a problem"""
+    # problems are a single line, boards list every item
+    return "\n" in (response(fake, token) or "")
+
+
+def reacted_at(fake: FakeDiscord, key: Union[int, str]) -> Optional[float]:
+    """When the bot first reacted to a move, posted or made with /move"""
+    message_id = fake.response_id(key) if isinstance(key, str) else key
+    return fake.reacted_at.get(message_id)
+
+
+async def wait_for_games(bot, fake: FakeDiscord, games: List[Tuple[int, int]]):
+    """Wait until the bot loaded every game"""
+    await bot.wait_until_ready()
+    validation = bot.get_cog("Validation")
+    guild = bot.get_guild(fake.guild_id)
+    # game_in only looks at the guild and channel of the context
+    contexts = [
+        types.SimpleNamespace(guild=guild, channel=guild.get_channel(channel_id))
+        for channel_id, _ in games
+    ]
+    while not all(validation.game_in(ctx) for ctx in contexts):
+        await asyncio.sleep(0.05)
+
+
+async def wait_until_quiet(
+    fake: FakeDiscord, posted: Dict[Union[int, str], float], timeout: float
+):
+    """Wait until every move has a reaction and the bot stopped calling the API"""
+    deadline = time.perf_counter() + timeout
+    calls, changed = -1, time.perf_counter()
+    while time.perf_counter() < deadline:
+        total = sum(fake.calls.values())
+        if total != calls:
+            calls, changed = total, time.perf_counter()
+        reacted = all(reacted_at(fake, key) is not None for key in posted)
+        if reacted and time.perf_counter() - changed >= quiet_period:
+            return
+        await asyncio.sleep(0.1)
+
+
+async def run(args: argparse.Namespace) -> Dict:
+    fake = FakeDiscord(
+        args.games * 2,
+        players=args.players,
+        latency=args.latency / 1000,
+        jitter=args.jitter / 1000,
+        spurious_429=args.spurious_429,
+    )
+    await fake.start()
+    # the game and chat channel of each game
+    games = list(zip(fake.channel_ids[0::2], fake.channel_ids[1::2]))
+    directory = tempfile.TemporaryDirectory()
+    configure(games, directory.name, args.lean, args.shards)
+    discord.http.Route.BASE = fake.base_url
+    discord_slash.http.CustomRoute.BASE = fake.base_url
+
+    bot = create_bot()
+    await bot.login("loadtest")
+    connection = asyncio.create_task(bot.connect(reconnect=False))
+    try:
+        started = time.perf_counter()
+        loading = asyncio.create_task(wait_for_games(bot, fake, games))
+        # stop waiting if the bot can't connect
+        await asyncio.wait(
+            {loading, connection},
+            timeout=args.timeout,
+            return_when=asyncio.FIRST_COMPLETED,
+        )
+        if not loading.done():
+            loading.cancel()
+            if connection.done():
+                connection.result()
+            raise TimeoutError("The bot didn't load the games in time.")
+        startup_seconds = time.perf_counter() - started
+
+        transcripts = [
+            generate(
+                args.moves,
+                chat_rate=args.chat_rate,
+                edit_rate=args.edit_rate,
+                seed=args.seed + i,
+            )
+            for i in range(len(games))
+        ]
+        calls_before = fake.calls.copy()
+        statuses_before = fake.statuses.copy()
+        errors_before = error_count()
+        started = time.perf_counter()
+        # the games are played at the same time
+        replays = await asyncio.gather(
+            *(
+                replay(
+                    fake,
+                    channel_id,
+                    events,
+                    args.burst,
+                    args.interval,
+                    args.slash_rate,
+                    i,
+                )
+                for i, ((channel_id, _), events) in enumerate(zip(games, transcripts))
+            )
+        )
+        replay_seconds = time.perf_counter() - started
+        posted = {k: v for moves in replays for k, v in moves.items()}
+        # a /move that was rejected never gets a reaction
+        slash_rejected = [
+            key for key in posted if isinstance(key, str) and not made_board(fake, key)
+        ]
+        for key in slash_rejected:
+            del posted[key]
+        await wait_until_quiet(fake, posted, args.timeout)
+        calls = fake.calls - calls_before
+        statuses = fake.statuses - statuses_before
+        errors = error_count() - errors_before
+    finally:
+        await bot.close()
+        await connection
+        # save the games and stop the error log like a clean shutdown
+        for name in list(bot.extensions):
+            bot.unload_extension(name)
+        await fake.close()
+        directory.cleanup()
+
+    events = [event for events in transcripts for event in events]
+    reactions = {key: reacted_at(fake, key) for key in posted}
+    latencies = sorted(
+        (reactions[key] - at) * 1000
+        for key, at in posted.items()
+        if reactions[key] is not None
+    ) or [0.0]
+    slash_latencies = sorted(
+        (reactions[key] - at) * 1000
+        for key, at in posted.items()
+        if isinstance(key, str) and reactions[key] is not None
+    ) or [0.0]
+    http_errors = sum(n for status, n in statuses.items() if status >= 400) - (
+        statuses[429]
+    )
+    total_calls = sum(calls.values())
+    return {
+        "games": len(games),
+        "events": len(events),
+        "moves": len(posted),
+        "edits": sum(1 for event in events if event.edit_of is not None),
+        "startup_s": round(startup_seconds, 2),
+        "replay_s": round(replay_seconds, 2),
+        "moves_per_sec": round(len(posted) / replay_seconds, 1),
+        "slash_moves": sum(1 for key in posted if isinstance(key, str)),
+        "slash_rejected": len(slash_rejected),
+        "slash_rejected_hidden": len(fake.hidden_replies),
+        "unreacted_moves": sum(1 for at in reactions.values() if at is None),
+        "reaction_p50_ms": round(percentile(latencies, 0.5), 1),
+        "reaction_p95_ms": round(percentile(latencies, 0.95), 1),
+        "reaction_p99_ms": round(percentile(latencies, 0.99), 1),
+        "reaction_max_ms": round(latencies[-1], 1),
+        "reaction_mean_ms": round(statistics.fmean(latencies), 1),
+        "slash_reaction_p50_ms": round(percentile(slash_latencies, 0.5), 1),
+        "api_calls": total_calls,
+        "api_calls_per_move": round(total_calls / max(len(posted), 1), 2),
+        "api_calls_by_route": dict(calls.most_common()),
+        "rate_limited": statuses[429],
+        "http_errors": http_errors,
+        "bot_errors": errors,
+        "error_rate": round((http_errors + errors) / max(len(events), 1), 4),
+    }
+
+
+def main(argv: List[str]) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--games", type=int, default=2, help="games played at once")
+    parser.add_argument("--moves", type=int, default=200, help="moves per game")
+    parser.add_argument("--players", type=int, default=20)
+    parser.add_argument(
+        "--burst", type=int, default=10, help="messages posted at once in a game"
+    )
+    parser.add_argument(
+        "--interval", type=float, default=1.0, help="seconds between bursts"
+    )
+    parser.add_argument("--chat-rate", type=float, default=0.3)
+    parser.add_argument("--edit-rate", type=float, default=0.05)
+    parser.add_argument(
+        "--slash-rate",
+        type=float,
+        default=0.0,
+        help="share of moves made with /move instead of typed",
+    )
+    parser.add_argument(
+        "--latency", type=float, default=50, help="milliseconds per API call"
+    )
+    parser.add_argument(
+        "--jitter", type=float, default=20, help="random extra milliseconds"
+    )
+    parser.add_argument(
+        "--spurious-429",
+        type=float,
+        default=0.0,
+        help="chance of a 429 even when the bucket isn't empty",
+    )
+    parser.add_argument("--lean", action="store_true", help="run the bot in lean mode")
+    parser.add_argument(
+        "--shards", type=int, default=0, help="run the bot with this many shards"
+    )
+    parser.add_argument(
+        "--timeout", type=float, default=120, help="seconds to wait for the bot"
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="also write the report to this file")
+    args = parser.parse_args(argv)
+
+    report = asyncio.run(run(args))
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    return 1 if report["unreacted_moves"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -1,5 +1,5 @@
 import discord
-from typing import Optional, Union
+from typing import Any, Dict, Optional, Union
 from discord.embeds import EmptyEmbed, _EmptyEmbed
 
 PURPLE = discord.Color(int("EDD1EF", 16))
@@ -39,3 +39,13 @@ def build_embed(
     if thumbnail:
         embed.set_thumbnail(url=thumbnail)
     return embed
+
+
+def stats_embed(title: str, sections: Dict[str, Dict[str, Any]]) -> discord.Embed:
+    """Embed sections of named statistics"""
+    description = "\n\n".join(
+        f"**{heading}**\n"
+        + "\n".join(f"{name}: **{value}**" for name, value in stats.items())
+        for heading, stats in sections.items()
+    )
+    return build_embed(title=title, description=description)
@@ -0,0 +1,78 @@
+import os
+import random
+import resource
+import sys
+from typing import Collection, Optional, Set, Tuple, Type
+
+import discord
+
+# objects shared between caches, which are measured as part of their own cache
+shared_types: Tuple[Type, ...] = (
+    discord.Client,
+    discord.Guild,
+    discord.abc.GuildChannel,
+    discord.abc.User,
+    discord.Message,
+    discord.Role,
+)
+
+
+def rss_bytes() -> Optional[int]:
+    """Resident memory of the process"""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        # peak resident memory in kilobytes where /proc is not available
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def deep_size(
+    obj: object, seen: Optional[Set[int]] = None, shared: Tuple[Type, ...] = ()
+) -> int:
+    """Size of an object and the objects only it refers to
+    Objects of the shared types (and of `shared_types`) are not followed
+    """
+    seen = seen if seen is not None else set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, (str, bytes, int, float, bool, type(None))):
+        return size
+    if isinstance(obj, dict):
+        refs = [*obj.keys(), *obj.values()]
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        refs = list(obj)
+    else:
+        refs = list(getattr(obj, "__dict__", {}).values())
+        for cls in type(obj).__mro__:
+            for name in getattr(cls, "__slots__", ()):
+                if hasattr(obj, name):
+                    refs.append(getattr(obj, name))
+    for ref in refs:
+        if isinstance(ref, shared_types + shared) or callable(ref):
+            continue
+        size += deep_size(ref, seen, shared)
+    return size
+
+
+def estimate(
+    objects: Collection, sample: int = 32, shared: Tuple[Type, ...] = ()
+) -> int:
+    """Estimate the memory of a collection from a random sample of it"""
+    if not objects:
+        return 0
+    items = list(objects)
+    picked = random.sample(items, min(sample, len(items)))
+    seen: Set[int] = set()
+    measured = sum(deep_size(obj, seen, shared) for obj in picked)
+    return sys.getsizeof(objects) + measured * len(items) // len(picked)
+
+
+def format_bytes(size: float) -> str:
+    for unit in ("B", "KiB", "MiB"):
+        if size < 1024:
+            return f"{size:.1f} {unit}" if unit != "B" else f"{size:.0f} B"
+        size /= 1024
+    return f"{size:.1f} GiB"
@@ -0,0 +1,204 @@
+import re
+import time
+from bisect import bisect_left
+from typing import Any, Dict, List, Optional, Tuple
+
+import config
+
+# upper bounds in seconds of the histogram buckets
+buckets = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+# ids in an API path, and the interaction tokens that follow an id
+path_id = re.compile(r"/\d+(?=/|$)")
+path_token = re.compile(r"(/(?:interactions|webhooks)/\{id\}/)[^/]+")
+
+
+class Histogram:
+    """Counts of observed durations by bucket"""
+
+    __slots__ = ("counts", "count", "sum", "max")
+
+    def __init__(self):
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float):
+        self.counts[bisect_left(buckets, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        self.max = max(self.max, seconds)
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket containing the quantile"""
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return self.max
+
+
+class Timer:
+    """Observes the time spent in a with block"""
+
+    __slots__ = ("histogram", "start")
+
+    def __init__(self, histogram: Histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *_):
+        self.histogram.observe(time.perf_counter() - self.start)
+
+
+class NullTimer:
+    """Timer used while metrics are turned off"""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        pass
+
+
+null_timer = NullTimer()
+
+
+class Metrics:
+    """Counters and latency histograms of the validation pipeline
+
+    Every method returns immediately while metrics are turned off, so the
+    instrumented code only pays for a function call.
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self.started = time.time()
+        self.__counters: Dict[str, Dict[Labels, float]] = {}
+        self.__histograms: Dict[str, Dict[Labels, Histogram]] = {}
+        self.__help: Dict[str, str] = {}
+
+    def describe(self, name: str, text: str):
+        """Set the help text of a metric"""
+        self.__help[name] = text
+
+    def inc(self, name: str, amount: float = 1, **labels: str):
+        """Add to a counter"""
+        if not self.enabled:
+            return
+        series = self.__counters.setdefault(name, {})
+        key = tuple(labels.items())
+        series[key] = series.get(key, 0) + amount
+
+    def observe(self, name: str, seconds: float, **labels: str):
+        """Add a duration to a histogram"""
+        if not self.enabled:
+            return
+        self.__histogram(name, labels).observe(seconds)
+
+    def timer(self, name: str, **labels: str):
+        """Context manager adding the duration of its block to a histogram"""
+        if not self.enabled:
+            return null_timer
+        return Timer(self.__histogram(name, labels))
+
+    def __histogram(self, name: str, labels: Dict[str, str]) -> Histogram:
+        series = self.__histograms.setdefault(name, {})
+        key = tuple(labels.items())
+        histogram = series.get(key)
+        if histogram is None:
+            histogram = series[key] = Histogram()
+        return histogram
+
+    def counter(self, name: str) -> Dict[Labels, float]:
+        """Returns the values of a counter by labels"""
+        return self.__counters.get(name, {})
+
+    def histogram(self, name: str) -> Dict[Labels, Histogram]:
+        """Returns the histograms of a metric by labels"""
+        return self.__histograms.get(name, {})
+
+    def render(self) -> str:
+        """Returns all metrics in the Prometheus text format"""
+        lines: List[str] = []
+        for name, series in sorted(self.__counters.items()):
+            self.__header(lines, name, "counter")
+            for labels, value in series.items():
+                lines.append(f"{name}{format_labels(labels)} {value:g}")
+        for name, series in sorted(self.__histograms.items()):
+            self.__header(lines, name, "histogram")
+            for labels, histogram in series.items():
+                cumulative = 0
+                for bound, count in zip(buckets, histogram.counts):
+                    cumulative += count
+                    le = format_labels(labels + (("le", f"{bound:g}"),))
+                    lines.append(f"{name}_bucket{le} {cumulative}")
+                le = format_labels(labels + (("le", "+Inf"),))
+                lines.append(f"{name}_bucket{le} {histogram.count}")
+                lines.append(f"{name}_sum{format_labels(labels)} {histogram.sum:g}")
+                lines.append(f"{name}_count{format_labels(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def __header(self, lines: List[str], name: str, kind: str):
+        if name in self.__help:
+            lines.append(f"# HELP {name} {self.__help[name]}")
+        lines.append(f"# TYPE {name} {kind}")
+
+
+def format_labels(labels: Labels) -> str:
+    """Write labels as {name="value",...}"""
+    if not labels:
+        return ""
+    escaped = (
+        (name, value.replace("\\", "\\\\").replace('"', '\\"'))
+        for name, value in labels
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+def label_text(labels: Labels, default: Optional[str] = None) -> str:
+    """Short text naming a series in a summary"""
+    return ", ".join(value for _, value in labels) or default or "all"
+
+
+def route_template(path: str) -> str:
+    """Replace the ids and tokens of a path that was formatted before the call
+    (like the routes of slash commands), so each route is a single series
+    """
+    return path_token.sub(r"\1{token}", path_id.sub("/{id}", path))
+
+
+def instrument_http(http: Any):
+    """Count and time every call to Discord's REST API made by the bot,
+    by method and route, whether or not it goes through the outbox
+    """
+    request = http.request
+
+    async def counted_request(route, *args, **kwargs):
+        name = f"{route.method} {route_template(route.path)}"
+        metrics.inc("api_calls_total", route=name)
+        with metrics.timer("api_call_seconds", route=name):
+            return await request(route, *args, **kwargs)
+
+    http.request = counted_request
+
+
+metrics = Metrics(config.METRICS_ENABLED)
+metrics.describe("events_seen_total", "Gateway events received by the validation cog")
+metrics.describe("events_matched_total", "Events containing a move")
+metrics.describe("validations_total", "Validated moves by outcome")
+metrics.describe("stage_seconds", "Time spent in each stage of validation")
+metrics.describe("queue_wait_seconds", "Time moves waited in the validation queue")
+metrics.describe("api_calls_total", "Discord API calls made by route")
+metrics.describe("api_call_seconds", "Duration of Discord API calls by route")
+metrics.describe("api_wait_seconds", "Time API calls waited for the rate budget")
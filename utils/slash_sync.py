@@ -0,0 +1,43 @@
+import hashlib
+import json
+import os
+
+from discord_slash import SlashCommand
+
+
+def manifest_hash(manifest: dict, application_id: int) -> str:
+    """Hash the registered slash commands of an application"""
+    text = json.dumps(
+        {"application": application_id, "commands": manifest},
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def read_hash(path: str) -> str:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return f.read().strip()
+    except OSError:
+        return ""
+
+
+def write_hash(path: str, digest: str):
+    temp = f"{path}.tmp"
+    with open(temp, "w", encoding="utf-8") as f:
+        f.write(digest)
+    os.replace(temp, path)
+
+
+async def sync_if_changed(slash: SlashCommand, application_id: int, path: str) -> bool:
+    """Sync slash commands with Discord only if they changed since the last sync
+    Returns whether commands were synced
+    """
+    digest = manifest_hash(await slash.to_dict(), application_id)
+    if digest == read_hash(path):
+        return False
+    await slash.sync_all_commands()
+    # only remember the manifest once Discord has accepted it
+    write_hash(path, digest)
+    return True
@@ -0,0 +1,45 @@
+import time
+from contextlib import contextmanager
+from typing import Iterator, Set
+
+
+class StartupTimer:
+    """Logs how long each phase of starting the bot takes
+
+    Times are measured from when this module is first imported, which
+    bot.py does before importing anything else. Nothing is logged unless the
+    timer is enabled, so code shared with offline tools stays quiet.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.enabled = False
+        self.__marked: Set[str] = set()
+
+    def elapsed(self) -> float:
+        """Seconds since the process started importing the bot"""
+        return time.perf_counter() - self.started
+
+    def mark(self, name: str):
+        """Log the time since start the first time a point is reached"""
+        if not self.enabled or name in self.__marked:
+            return
+        self.__marked.add(name)
+        print(f"[startup] {name} at {self.elapsed() * 1000:.0f} ms")
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """Log the duration of a phase and the time since start when it ends"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            if self.enabled:
+                duration = time.perf_counter() - start
+                print(
+                    f"[startup] {name} took {duration * 1000:.0f} ms"
+                    f" (at {self.elapsed() * 1000:.0f} ms)"
+                )
+
+
+startup = StartupTimer()